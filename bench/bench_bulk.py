@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from discord.http import HTTPClient, Route
+from bulk import run_bulk
+from fake_rest import FakeRest
+
+# bulk ban throughput against the local fake REST server at several worker counts.
+
+GUILD_ID = 1000
+
+
+async def run(ids, concurrency, args):
+    server = FakeRest(limit=args.limit, per=args.per, latency=args.latency, not_found_every=args.not_found_every)
+    Route.BASE = await server.start()
+    http = HTTPClient(asyncio.get_running_loop())
+    await http.static_login('bench')
+    try:
+        start = time.perf_counter()
+        result = await run_bulk(ids, lambda user_id: http.ban(user_id, GUILD_ID), concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+    finally:
+        await http.close()
+        await server.stop()
+    print(f'workers {concurrency:3}   {len(ids) / elapsed:7.1f} bans/s   {elapsed:6.2f}s   '
+          f'{server.calls} requests, {server.rate_limited} 429s   {result.counts()}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ids', type=int, default=500)
+    parser.add_argument('--workers', default='1,5,10,25')
+    parser.add_argument('--limit', type=int, default=50, help='requests per bucket window')
+    parser.add_argument('--per', type=float, default=1.0, help='bucket window in seconds')
+    parser.add_argument('--latency', type=float, default=0.05, help='server latency per request in seconds')
+    parser.add_argument('--not-found-every', type=int, default=17)
+    args = parser.parse_args()
+    ids = [10**17 + n for n in range(args.ids)]
+    for concurrency in map(int, args.workers.split(',')):
+        asyncio.run(run(ids, concurrency, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import discord
+from discord.member import Member
+from discord.presences import RawPresenceUpdateEvent
+from intents import bot_options, should_chunk
+
+# memory and cache-build time of the full vs minimal intents modes.
+# synthetic GUILD_CREATE and GUILD_MEMBERS_CHUNK payloads are fed straight into
+# discord.py's connection state, no network involved. a third of members are online.
+
+BOT_ID = 1
+
+
+def user(user_id):
+    return {'id': str(user_id), 'username': f'user{user_id}', 'discriminator': '0', 'global_name': None, 'avatar': None}
+
+
+def member(user_id, guild_id):
+    return {'user': user(user_id), 'roles': [str(guild_id)], 'joined_at': '2024-01-01T00:00:00+00:00', 'deaf': False, 'mute': False, 'flags': 0}
+
+
+#discord sends the whole member list inline for guilds under the large threshold
+def guild_create(guild_id, size, presences):
+    inline = [] if size > 250 else list(member_chunks(guild_id, size, presences, chunk_size=250))
+    return {
+        'id': str(guild_id),
+        'name': f'guild {guild_id}',
+        'owner_id': str(BOT_ID),
+        'member_count': size,
+        'large': size > 250,
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+        'channels': [{'id': str(guild_id + 1), 'type': 0, 'name': 'general', 'position': 0, 'permission_overwrites': []}],
+        'members': [member(BOT_ID, guild_id)] + [m for chunk in inline for m in chunk['members']],
+        'emojis': [],
+        'stickers': [],
+        'features': [],
+        'presences': [p for chunk in inline for p in chunk.get('presences', [])],
+    }
+
+
+def member_chunks(guild_id, size, presences, chunk_size=1000):
+    first = guild_id * 10_000_000
+    for start in range(0, size, chunk_size):
+        ids = range(first + start, first + min(start + chunk_size, size))
+        chunk = {'guild_id': str(guild_id), 'members': [member(i, guild_id) for i in ids]}
+        if presences:
+            chunk['presences'] = [
+                {'user': {'id': str(i)}, 'status': 'online', 'activities': [], 'client_status': {'desktop': 'online'}}
+                for i in ids if i % 3 == 0
+            ]
+        yield chunk
+
+
+def ingest(state, guild, chunk):
+    presences = {p['user']['id']: p for p in chunk.get('presences', [])}
+    for data in chunk['members']:
+        added = Member(guild=guild, data=data, state=state)
+        presence = presences.get(data['user']['id'])
+        if presence:
+            added._presence_update(RawPresenceUpdateEvent(data=presence, state=state), presence['user'])
+        guild._add_member(added)
+
+
+def run(mode, guilds, size, chunk_limit):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    client = discord.Client(**bot_options(mode, chunk_limit))
+    state = client._connection
+    for n in range(guilds):
+        guild_id = (n + 1) * 1000
+        guild = state._add_guild_from_data(guild_create(guild_id, size, state._intents.presences))
+        if state._guild_needs_chunking(guild) or (mode == 'minimal' and should_chunk(guild, chunk_limit)):
+            for chunk in member_chunks(guild_id, size, state._intents.presences):
+                ingest(state, guild, chunk)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    cached = sum(len(guild._members) for guild in client.guilds)
+    tracemalloc.stop()
+    print(f'{mode:8} {guilds:4} x {size:>7} members   cached {cached:>8}   {current / 2**20:8.1f} MiB   {elapsed * 1000:8.0f} ms')
+    del client, state
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--sizes', default='100,1000,10000,25000')
+    parser.add_argument('--chunk-limit', type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    for size in map(int, args.sizes.split(',')):
+        run('full', args.guilds, size, 0)
+        run('minimal', args.guilds, size, args.chunk_limit)
+
+
+if __name__ == '__main__':
+    main()
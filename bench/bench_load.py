@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from fake_discord import OWNER_ID, USER_BASE, FakeDiscord
+from storage import SCHEMA
+
+# end-to-end load test: master.py runs as a subprocess against the local fake
+# discord and each scenario measures, from the outside, how long the bot takes to
+# answer. reports throughput and p50/p99 latency per scenario.
+
+DISCORD_EPOCH = 1420070400000
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return float('nan')
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, count, elapsed, latencies, extra=''):
+    print(f'{name:16} {count:6} ops  {count / elapsed:8.1f} ops/s  '
+          f'p50 {percentile(latencies, 0.5) * 1000:8.1f}ms  p99 {percentile(latencies, 0.99) * 1000:8.1f}ms  {extra}')
+
+
+def seed_settings(path, server):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    for guild in server.guilds:
+        db.execute('INSERT INTO settings VALUES (?, ?, ?)', (guild.id, 'mod_mail_channel_id', json.dumps(guild.mod_mail)))
+        db.execute('INSERT INTO settings VALUES (?, ?, ?)', (guild.id, 'role_handler', json.dumps(str(guild.staff_role))))
+    db.commit()
+    db.close()
+
+
+def first_after(records, start, match=None):
+    for at, content in records:
+        if at >= start and (match is None or (content and match in content)):
+            return at - start
+    return None
+
+
+def final_followup(records):
+    return next(((at, content) for at, content in records if content and 'in line' not in content), None)
+
+
+async def ticket_storm(server, count):
+    sent = {}
+    start = time.perf_counter()
+    for n in range(count):
+        guild = server.guilds[n % len(server.guilds)]
+        user_id = guild.member_ids[n // len(server.guilds)]
+        interaction_id = await server.send_interaction(guild, user_id, 'ticket', {'reason': f'storm {n}'})
+        sent[interaction_id] = time.perf_counter()
+    followups = lambda i: server.records.get(('followup', f'token-{i}'), [])
+    try:
+        await server.wait_for(lambda: all(final_followup(followups(i)) for i in sent), timeout=120)
+    except TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    first = [first_after(server.records[('callback', i)], at) for i, at in sent.items() if server.records.get(('callback', i))]
+    finals = {i: final_followup(followups(i)) for i in sent}
+    opened = [finals[i][0] - at for i, at in sent.items() if finals[i] and 'done!' in finals[i][1]]
+    rejected = sum(1 for final in finals.values() if final and 'done!' not in final[1])
+    missing = sum(1 for final in finals.values() if final is None)
+    report('ticket open', count, elapsed, opened,
+           f'first response p99 {percentile(first, 0.99) * 1000:.1f}ms, opened {len(opened)}, rejected {rejected}, unanswered {missing}')
+
+
+async def close_storm(server):
+    tickets = [
+        (guild, channel) for guild in server.guilds
+        for _, channel in server.records.get(('channel_create', guild.id), [])
+        if channel['name'].endswith('-ticket')
+    ]
+    sent = {}
+    start = time.perf_counter()
+    for guild, channel in tickets:
+        owner = next(member for member in guild.member_ids if channel['name'].startswith(f'user{member % 100000}-'))
+        await server.user_message(int(channel['id']), owner, '!close', guild=guild)
+        sent[int(channel['id'])] = time.perf_counter()
+    closed = lambda channel_id: any('closed by' in (c or '') for _, c in server.records.get(('message', channel_id), []))
+    await server.wait_for(lambda: all(closed(channel_id) for channel_id in sent), timeout=120)
+    elapsed = time.perf_counter() - start
+    latencies = [first_after(server.records[('message', channel_id)], at, 'closed by') for channel_id, at in sent.items()]
+    report('ticket close', len(sent), elapsed, latencies)
+
+
+async def dm_flood(server, count):
+    owner_channel = OWNER_ID + 1
+    sent = {}
+    start = time.perf_counter()
+    for n in range(count):
+        user_id = USER_BASE + 900_000_000 + n
+        await server.user_dm(user_id, f'help {n}')
+        sent[user_id] = time.perf_counter()
+    relayed = {}
+
+    def collect():
+        for at, content in server.records.get(('message', owner_channel), []):
+            for user_id in re.findall(r'\(ID: (\d+)\)', content or ''):
+                relayed.setdefault(int(user_id), at)
+        return len(relayed)
+
+    #DMs over the relay cap never arrive, so stop once the digests stop growing
+    seen = -1
+    while seen != collect() and len(relayed) < len(sent):
+        seen = len(relayed)
+        try:
+            await server.wait_for(lambda: collect() > seen, timeout=5)
+        except TimeoutError:
+            pass
+    elapsed = max(relayed.values(), default=time.perf_counter()) - start
+    latencies = [relayed[user_id] - at for user_id, at in sent.items() if user_id in relayed]
+    report('dm flood', count, elapsed, latencies, f'relayed {len(latencies)}, dropped {count - len(latencies)}, owner messages {len(server.records.get(("message", owner_channel), []))}')
+
+
+async def join_wave(server, count):
+    guild = server.guilds[0]
+    presence_before = len(server.presence_updates)
+    start = time.perf_counter()
+    for n in range(count):
+        await server.member_join(guild, USER_BASE + 800_000_000 + n)
+    #a /ping after the wave answers once the bot has worked through every join
+    sentinel = await server.send_interaction(guild, guild.member_ids[0], 'ping')
+    sent_at = time.perf_counter()
+    await server.wait_for(lambda: server.records.get(('callback', sentinel)), timeout=60)
+    elapsed = time.perf_counter() - start
+    drain = first_after(server.records[('callback', sentinel)], sent_at)
+    #the member count is debounced, so one presence update should follow the whole wave
+    try:
+        await server.wait_for(lambda: len(server.presence_updates) > presence_before, timeout=10)
+    except TimeoutError:
+        pass
+    await asyncio.sleep(1)
+    activities = server.presence_updates[-1][1].get('activities') or [{}]
+    report('join wave', count, elapsed, [drain],
+           f'presence updates sent {len(server.presence_updates) - presence_before}, last "{activities[0].get("name")}"')
+
+
+#snowflakes carry their creation time, these accounts are minutes old
+def young_user_id(n):
+    return ((int(time.time() * 1000) - DISCORD_EPOCH) << 22) + n
+
+
+async def raid(server, count):
+    guild = server.guilds[1]
+    mod_mail = server.records[('message', guild.mod_mail)]
+    announced_before = len(mod_mail)
+    user_ids = [young_user_id(n) for n in range(count)]
+    start = time.perf_counter()
+    for user_id in user_ids:
+        await server.member_join(guild, user_id)
+    flooded = time.perf_counter() - start
+    sentinel = await server.send_interaction(guild, guild.member_ids[0], 'ping')
+    await server.wait_for(lambda: server.records.get(('callback', sentinel)), timeout=60)
+    drained = time.perf_counter() - start
+    await server.wait_for(lambda: server.records.get(('guild', guild.id)) and len(mod_mail) > announced_before, timeout=10)
+    detected = first_after(server.records[('guild', guild.id)], start)
+    ticket = await server.send_interaction(guild, guild.member_ids[1], 'ticket', {'reason': 'during a raid'})
+    #/ticket is deferred up front, the answer is a follow-up
+    await server.wait_for(lambda: server.records.get(('followup', f'token-{ticket}')), timeout=10)
+    paused = 'paused' in server.records[('followup', f'token-{ticket}')][0][1]
+    report('raid joins', count, flooded, [drained - flooded],
+           f'lockdown after {detected * 1000:.1f}ms, verification {guild.verification_level}, ticket paused {paused}')
+
+    bans_before = len(server.bans)
+    calls_before = server.route_calls.get('POST /api/v10/guilds/{guild_id}/bulk-ban', 0)
+    #a moderator with a role, the new accounts have none
+    interaction_id = await server.send_interaction(guild, guild.member_ids[0], 'raid', {'action': 'ban'}, roles=[guild.staff_role])
+    sent_at = time.perf_counter()
+    token = f'token-{interaction_id}'
+    await server.wait_for(lambda: any(content and 'finished' in content for _, content in server.records.get(('followup', token), [])), timeout=120)
+    elapsed = first_after(server.records[('followup', token)], sent_at, 'finished')
+    banned = len(server.bans) - bans_before
+    report('raid ban', banned, elapsed, [elapsed],
+           f'{server.route_calls.get("POST /api/v10/guilds/{guild_id}/bulk-ban", 0) - calls_before} bulk ban requests')
+
+    interaction_id = await server.send_interaction(guild, guild.member_ids[0], 'raid', {'action': 'end'})
+    await server.wait_for(lambda: server.records.get(('followup', f'token-{interaction_id}')), timeout=10)
+    print(f'{"":16} lockdown lifted, verification back to {guild.verification_level}')
+
+
+async def moderation_burst(server, count):
+    guild = server.guilds[0]
+    sent = {}
+    start = time.perf_counter()
+    for n in range(count):
+        target = USER_BASE + 700_000_000 + n
+        interaction_id = await server.send_interaction(guild, guild.member_ids[0], 'banid', {'user_id': str(target)})
+        sent[interaction_id] = time.perf_counter()
+    #/banid is deferred first, the ban lands with the follow-up
+    followups = lambda i: server.records.get(('followup', f'token-{i}'), [])
+    await server.wait_for(lambda: all(first_after(followups(i), 0, 'has been banned') is not None for i in sent), timeout=120)
+    elapsed = time.perf_counter() - start
+    first = [first_after(server.records[('callback', i)], at) for i, at in sent.items()]
+    latencies = [first_after(followups(i), at, 'has been banned') for i, at in sent.items()]
+    report('moderation', count, elapsed, latencies, f'first response p99 {percentile(first, 0.99) * 1000:.1f}ms, bans recorded {len(server.bans)}')
+
+
+#the bot's own view of the run, from its /metrics endpoint
+async def print_bot_metrics(port):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+            text = await response.text()
+    for line in text.splitlines():
+        if line.startswith(('bot_handler_seconds_count', 'bot_http_seconds_count', 'bot_loop_lag_max')) or (
+            line.startswith('bot_http_rate_limited_total') and not line.endswith(' 0')
+        ):
+            print(f'  {line}')
+
+
+async def main(args):
+    server = FakeDiscord(guilds=args.guilds, members=args.members, shards=args.shards or 1, limit=args.limit, per=args.per, latency=args.latency, inject_429=args.inject_429)
+    base = await server.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_settings(os.path.join(workdir, 'mod_mail.db'), server)
+        env = dict(
+            os.environ, TOKEN='bench', BOT_CREATOR_ID=str(OWNER_ID), PREFIX='!', DISCORD_API_BASE=base,
+            DISCORD_GATEWAY=f'ws://{server.host}:{server.port}/gateway',
+            MOD_MAIL_DB=os.path.join(workdir, 'mod_mail.db'), TRANSCRIPT_DIR=os.path.join(workdir, 'transcripts'),
+            PRESENCE_WINDOW=str(args.presence_window), INTENTS_MODE=args.intents,
+        )
+        if args.metrics_port:
+            env.update(METRICS_ENABLED='1', METRICS_PORT=str(args.metrics_port))
+        #sharded runs go through the cluster launcher
+        script = 'master.py'
+        if args.shards:
+            script = 'cluster.py'
+            env.update(SHARD_COUNT=str(args.shards), CLUSTER_COUNT=str(args.clusters))
+        started = time.perf_counter()
+        bot = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(ROOT, script), cwd=workdir, env=env,
+            stdout=None if args.verbose else asyncio.subprocess.DEVNULL,
+            stderr=None if args.verbose else asyncio.subprocess.DEVNULL,
+        )
+        try:
+            await asyncio.wait_for(server.identified.wait(), 30)
+            await server.wait_for(lambda: server.presence_updates, timeout=30)
+            print(f'bot ready in {time.perf_counter() - started:.2f}s '
+                  f'({args.guilds} guilds, {args.members} members each, intents={args.intents}, '
+                  f'{f"{args.shards} shards in {args.clusters} processes" if args.shards else "unsharded"})')
+            scenarios = args.scenarios.split(',')
+            if 'tickets' in scenarios:
+                await ticket_storm(server, args.count)
+                await close_storm(server)
+            if 'dms' in scenarios:
+                await dm_flood(server, args.count)
+            if 'joins' in scenarios:
+                await join_wave(server, args.count * 10)
+            if 'raid' in scenarios:
+                await raid(server, args.count * 10)
+            if 'moderation' in scenarios:
+                await moderation_burst(server, args.count)
+            print(f'REST calls {server.calls}, 429s {server.rate_limited}')
+            if server.unknown_routes:
+                print(f'unhandled routes: {dict(server.unknown_routes)}')
+            if args.metrics_port:
+                await print_bot_metrics(args.metrics_port)
+        finally:
+            if bot.returncode is None:
+                bot.terminate()
+                await bot.wait()
+            await server.stop()
+
+
+if __name__ == '__main__':
+    #the bot is killed mid-request at the end of a run, which aiohttp logs as an error
+    logging.getLogger('aiohttp.server').setLevel(logging.CRITICAL)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default='tickets,dms,joins,raid,moderation')
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--guilds', type=int, default=4)
+    parser.add_argument('--members', type=int, default=250)
+    parser.add_argument('--limit', type=int, default=50, help='requests per bucket window')
+    parser.add_argument('--per', type=float, default=1.0, help='bucket window in seconds')
+    parser.add_argument('--latency', type=float, default=0.02, help='REST latency in seconds')
+    parser.add_argument('--inject-429', type=float, default=0.0, help='fraction of requests answered with a 429')
+    parser.add_argument('--presence-window', type=float, default=2.0)
+    parser.add_argument('--intents', default='full')
+    parser.add_argument('--shards', type=int, default=0, help='run sharded through cluster.py')
+    parser.add_argument('--clusters', type=int, default=1)
+    parser.add_argument('--metrics-port', type=int, default=0, help='turn on the bot metrics and print them at the end')
+    parser.add_argument('--verbose', action='store_true')
+    asyncio.run(main(parser.parse_args()))
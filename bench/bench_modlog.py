@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import MOD_ACTIONS, ModMailStore
+
+# fills the audit log with millions of actions through the normal write-behind path,
+# then times /modlog style queries: first page and deep cursor pages for a guild,
+# a target user, a moderator, an action and a time window.
+
+async def fill(store, rows, guilds, users, chunk=50000):
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for offset in range(0, rows, chunk):
+        for _ in range(min(chunk, rows - offset)):
+            store.log_action(
+                rng.randrange(guilds), rng.choice(MOD_ACTIONS), 10**17 + rng.randrange(users),
+                10**17 + rng.randrange(50), 'spam', None
+            )
+        await store.flush()
+    elapsed = time.perf_counter() - start
+    print(f'inserted {rows} actions in {elapsed:.1f}s ({rows / elapsed:.0f}/s)')
+
+async def time_query(name, store, repeat=50, pages=5, **filters):
+    samples = []
+    for _ in range(repeat):
+        cursor = None
+        for _ in range(pages):
+            start = time.perf_counter()
+            entries = await store.mod_actions(0, before=cursor, limit=11, **filters)
+            samples.append(time.perf_counter() - start)
+            if len(entries) < 11:
+                break
+            cursor = entries[9].id
+    samples.sort()
+    print(f'{name:12} p50 {samples[len(samples) // 2] * 1000:6.2f}ms   p99 {samples[int(len(samples) * 0.99)] * 1000:6.2f}ms')
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ModMailStore(os.path.join(tmp, 'mod_mail.db'))
+        await store.start()
+        await fill(store, args.rows, args.guilds, args.users)
+        await time_query('guild', store)
+        await time_query('target', store, target_id=10**17 + 7)
+        await time_query('moderator', store, moderator_id=10**17 + 3)
+        await time_query('action', store, action='purge')
+        await time_query('last hour', store, since=time.time() - 3600)
+        await time_query('combined', store, target_id=10**17 + 7, action='ban')
+        await store.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--guilds', type=int, default=20)
+    parser.add_argument('--users', type=int, default=100_000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from bench_load import first_after, percentile, seed_settings
+from fake_discord import OWNER_ID, FakeDiscord
+
+# cold start vs hot reload. the bot runs from a scratch copy of the repo against the
+# local fake discord. a cold start is process launch until the first presence update
+# (gateway connect, guild data, command sync check); a reload is `!reload <extension>`
+# until the bot's confirmation. it then edits one command in the copy, reloads, and
+# checks that only that command was sent to discord and that a ticket opened before
+# the reloads can still be closed after them.
+
+
+class Bot:
+    def __init__(self, app_dir, workdir, server, base, **env):
+        self.app_dir = app_dir
+        self.env = env
+        self.workdir = workdir
+        self.server = server
+        self.base = base
+        self.lines = []
+        self.process = None
+
+    async def start(self, verbose=False):
+        env = dict(
+            os.environ, TOKEN='bench', BOT_CREATOR_ID=str(OWNER_ID), PREFIX='!', DISCORD_API_BASE=self.base,
+            DISCORD_GATEWAY=f'ws://{self.server.host}:{self.server.port}/gateway', PYTHONUNBUFFERED='1',
+            MOD_MAIL_DB=os.path.join(self.workdir, 'mod_mail.db'), TRANSCRIPT_DIR=os.path.join(self.workdir, 'transcripts'),
+            **self.env
+        )
+        started = time.perf_counter()
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(self.app_dir, 'master.py'), cwd=self.workdir, env=env,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+        self._reader = asyncio.create_task(self._read(verbose))
+        await asyncio.wait_for(self.server.identified.wait(), 30)
+        await self.server.wait_for(lambda: self.server.presence_updates, timeout=30)
+        return time.perf_counter() - started
+
+    async def _read(self, verbose):
+        async for line in self.process.stdout:
+            line = line.decode().rstrip()
+            self.lines.append(line)
+            if verbose:
+                print(f'  | {line}')
+
+    def line(self, prefix):
+        return next((line for line in self.lines if line.startswith(prefix)), '')
+
+    async def stop(self):
+        if self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+        await self._reader
+
+
+async def cold_start(app_dir, workdir, verbose):
+    server = FakeDiscord(guilds=4, members=250)
+    bot = Bot(app_dir, workdir, server, await server.start())
+    try:
+        elapsed = await bot.start(verbose)
+        await server.wait_for(lambda: bot.line('Loaded extensions'), timeout=10)
+        print(f'cold start {elapsed * 1000:8.1f}ms   {bot.line("Bot is ready!")[15:-1]}, {bot.line("Loaded extensions").lower()}')
+        return elapsed
+    finally:
+        await bot.stop()
+        await server.stop()
+
+
+async def owner_command(server, channel_id, content, match):
+    sent = time.perf_counter()
+    await server.user_message(channel_id, OWNER_ID, content, guild=server.guilds[0])
+    await server.wait_for(lambda: first_after(server.records.get(('message', channel_id), []), sent, match) is not None, timeout=30)
+    return first_after(server.records[('message', channel_id)], sent, match), server.records[('message', channel_id)][-1][1]
+
+
+async def hot_reloads(app_dir, workdir, repeat, verbose):
+    server = FakeDiscord(guilds=4, members=250)
+    bot = Bot(app_dir, workdir, server, await server.start())
+    guild = server.guilds[0]
+    try:
+        await bot.start(verbose)
+        #a ticket opened before any reload, closed after all of them
+        user_id = guild.member_ids[0]
+        await server.send_interaction(guild, user_id, 'ticket', {'reason': 'before reload'})
+        await server.wait_for(lambda: server.records.get(('channel_create', guild.id)), timeout=30)
+        ticket_channel = int(server.records[('channel_create', guild.id)][0][1]['id'])
+
+        for extension in ('tickets', 'moderation', 'utility', 'owner', ''):
+            samples = []
+            for _ in range(repeat):
+                elapsed, reply = await owner_command(server, guild.general, f'!reload {extension}'.strip(), 'Reloaded')
+                samples.append(elapsed)
+            print(f'reload {extension or "all":10} p50 {percentile(samples, 0.5) * 1000:7.1f}ms  p99 {percentile(samples, 0.99) * 1000:7.1f}ms   {reply.strip("`")}')
+
+        #change one command's description in the copy and reload just that extension
+        path = os.path.join(app_dir, 'cogs', 'utility.py')
+        with open(path) as file:
+            source = file.read()
+        with open(path, 'w') as file:
+            file.write(source.replace("description='how slow is meiple?'", "description='how fast is meiple?'"))
+        syncs_before = len(server.records.get('sync', []))
+        elapsed, reply = await owner_command(server, guild.general, '!reload utility', 'Reloaded')
+        upserts = [name for _, name in server.records.get('upsert', [])]
+        print(f'edited /ping    {elapsed * 1000:7.1f}ms   {reply.strip("`")}')
+        print(f'                commands upserted {upserts}, full syncs {len(server.records.get("sync", [])) - syncs_before}')
+
+        elapsed, reply = await owner_command(server, ticket_channel, '!close', 'closed by')
+        print(f'ticket opened before the reloads closed after them in {elapsed * 1000:.1f}ms')
+    finally:
+        await bot.stop()
+        await server.stop()
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = os.path.join(tmp, 'app')
+        shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns('.git', 'bench', 'assets', '__pycache__', '*.db', 'transcripts'))
+        workdir = os.path.join(tmp, 'run')
+        os.makedirs(workdir)
+        server = FakeDiscord(guilds=4, members=250)
+        seed_settings(os.path.join(workdir, 'mod_mail.db'), server)
+        #the first start syncs every command, later ones find them unchanged
+        starts = [await cold_start(app_dir, workdir, args.verbose) for _ in range(args.starts)]
+        print(f'cold start p50 {percentile(starts, 0.5) * 1000:.1f}ms over {len(starts)} starts')
+        await hot_reloads(app_dir, workdir, args.repeat, args.verbose)
+
+
+if __name__ == '__main__':
+    logging.getLogger('aiohttp.server').setLevel(logging.CRITICAL)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--starts', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--verbose', action='store_true')
+    asyncio.run(main(parser.parse_args()))
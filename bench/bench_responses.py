@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from bench_load import percentile, seed_settings
+from bench_reload import Bot
+from fake_discord import OWNER_ID, USER_BASE, FakeDiscord
+
+# time to first response. the fake discord makes the ban route slower than discord's
+# 3 second interaction window and sends a burst of /banid: every interaction should be
+# acknowledged (deferred) within milliseconds and answered once the ban goes through.
+# it also checks /ping answers with the gateway latency between 50 and 100ms, and
+# that with the defer timer at zero every command still gets exactly one reply.
+
+BAN_ROUTE = 'PUT /api/v10/guilds/{guild_id}/bans/{user_id}'
+
+
+#(acknowledgements, messages with content), discord allows exactly one acknowledgement
+def replies(server, interaction_id):
+    callbacks = server.records.get(('callback', interaction_id), [])
+    followups = server.records.get(('followup', f'token-{interaction_id}'), [])
+    return len(callbacks), sum(1 for _, content in callbacks + followups if content)
+
+
+async def ping(server, guild):
+    interaction_id = await server.send_interaction(guild, guild.member_ids[0], 'ping')
+    await server.wait_for(lambda: server.records.get(('callback', interaction_id)), timeout=10)
+    return server.records[('callback', interaction_id)][0][1]
+
+
+async def slow_bans(server, guild, count, slow):
+    sent = {}
+    start = time.perf_counter()
+    for n in range(count):
+        interaction_id = await server.send_interaction(guild, guild.member_ids[0], 'banid', {'user_id': str(USER_BASE + 600_000_000 + n)})
+        sent[interaction_id] = time.perf_counter()
+    answered = lambda i: any(content and 'banned' in content for _, content in server.records.get(('followup', f'token-{i}'), []))
+    await server.wait_for(lambda: all(answered(i) for i in sent), timeout=slow * 3 + 60)
+    first = [server.records[('callback', i)][0][0] - at for i, at in sent.items()]
+    final = [next(t for t, c in server.records[('followup', f'token-{i}')] if c and 'banned' in c) - at for i, at in sent.items()]
+    #the defer is private, the ban confirmation replaces it with a public message
+    public = sum(1 for i in sent if not server.records[('followup_ephemeral', f'token-{i}')][-1][1])
+    print(f'/banid x{count:<4} ban route {slow:.1f}s   first response p50 {percentile(first, 0.5) * 1000:6.1f}ms  '
+          f'p99 {percentile(first, 0.99) * 1000:6.1f}ms  past 3s {sum(f > 3 for f in first)}   '
+          f'answer p50 {percentile(final, 0.5):.2f}s  in {time.perf_counter() - start:.2f}s   public answers {public}')
+
+
+async def every_command_once(server, guild):
+    names = [('ping', {}), ('queue', {}), ('help', {}), ('modlog', {}), ('banid', {'user_id': 'nope'}), ('raid', {})]
+    sent = [(name, await server.send_interaction(guild, guild.member_ids[0], name, options)) for name, options in names]
+    await asyncio.sleep(2)
+    counts = {name: replies(server, i) for name, i in sent}
+    private = [name for name, i in sent if any(flag for _, flag in server.records.get(('followup_ephemeral', f'token-{i}'), []))]
+    print(f'defer timer at 0s: acknowledged once {all(acks == 1 for acks, _ in counts.values())}, '
+          f'messages per command {dict((name, messages) for name, (_, messages) in counts.items())}, private follow-ups {private}')
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        server = FakeDiscord(guilds=1, members=250, heartbeat_interval=0.5, heartbeat_delay=args.heartbeat_delay,
+                             route_latency={BAN_ROUTE: args.slow})
+        seed_settings(os.path.join(workdir, 'mod_mail.db'), server)
+        bot = Bot(ROOT, workdir, server, await server.start())
+        guild = server.guilds[0]
+        try:
+            await bot.start(args.verbose)
+            #wait for a few heartbeat acks so the latency is settled
+            await asyncio.sleep(2)
+            print(f'/ping at {args.heartbeat_delay * 1000:.0f}ms gateway latency: {await ping(server, guild)}')
+            await slow_bans(server, guild, args.count, args.slow)
+            interaction_id = await server.send_interaction(guild, OWNER_ID, 'stats')
+            await server.wait_for(lambda: server.records.get(('callback', interaction_id)), timeout=10)
+            print(server.records[('callback', interaction_id)][0][1].strip('`'))
+        finally:
+            await bot.stop()
+            await server.stop()
+
+        server = FakeDiscord(guilds=1, members=250)
+        bot = Bot(ROOT, workdir, server, await server.start(), RESPONSE_DEFER_AFTER='0')
+        try:
+            await bot.start(args.verbose)
+            await every_command_once(server, server.guilds[0])
+        finally:
+            await bot.stop()
+            await server.stop()
+
+
+if __name__ == '__main__':
+    logging.getLogger('aiohttp.server').setLevel(logging.CRITICAL)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--slow', type=float, default=4.0, help='seconds the ban route takes')
+    parser.add_argument('--heartbeat-delay', type=float, default=0.075)
+    parser.add_argument('--verbose', action='store_true')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import ModMailStore
+
+# burst of /ticket opens spread over many guilds: legacy whole-file json rewrite
+# vs the sqlite write-behind store. reports tickets/s and the worst event loop stall.
+
+async def watch_loop(stop, stalls):
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        stalls.append(now - last - 0.001)
+        last = now
+
+async def run(name, open_ticket, tickets, guilds, finish=None):
+    stop = asyncio.Event()
+    stalls = []
+    watcher = asyncio.create_task(watch_loop(stop, stalls))
+    start = time.perf_counter()
+    await asyncio.gather(*(open_ticket(i % guilds, 10**17 + i) for i in range(tickets)))
+    if finish:
+        await finish()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await watcher
+    print(f'{name:8} {tickets / elapsed:10.0f} tickets/s   worst loop stall {max(stalls, default=0) * 1000:7.1f}ms')
+
+async def bench_legacy(path, tickets, guilds):
+    settings = {}
+
+    async def open_ticket(guild_id, user_id):
+        settings[user_id] = (user_id + 1, f'user-{user_id}-ticket')
+        with open(path, 'w') as file:
+            json.dump(settings, file)
+
+    await run('json', open_ticket, tickets, guilds)
+
+async def bench_store(path, tickets, guilds):
+    store = ModMailStore(path, flush_interval=0.05)
+    await store.start()
+
+    async def open_ticket(guild_id, user_id):
+        settings = await store.guild(guild_id)
+        settings.open_ticket(user_id, user_id + 1, f'user-{user_id}-ticket')
+
+    await run('sqlite', open_ticket, tickets, guilds, finish=store.flush)
+    await store.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickets', type=int, default=5000)
+    parser.add_argument('--guilds', type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(bench_legacy(os.path.join(tmp, 'mod_mail_settings.json'), args.tickets, args.guilds))
+        asyncio.run(bench_store(os.path.join(tmp, 'mod_mail.db'), args.tickets, args.guilds))
+
+if __name__ == '__main__':
+    main()
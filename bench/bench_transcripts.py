@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import datetime
+import gzip
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transcripts import TranscriptWriter
+
+# transcript archiving of long tickets: throughput, output size and peak traced
+# memory. history is generated lazily like channel.history pages would be.
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Author:
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+async def history(count):
+    authors = [Author(10**17, 'ticket-owner'), Author(10**17 + 1, 'moderator')]
+    for n in range(count):
+        attachments = [SimpleNamespace(url=f'https://cdn.example/{n}.png')] if n % 50 == 0 else []
+        yield SimpleNamespace(
+            id=10**18 + n,
+            author=authors[n % 2],
+            created_at=START + datetime.timedelta(seconds=n),
+            content=f'message {n} ' + 'lorem ipsum dolor sit amet ' * (n % 8),
+            attachments=attachments,
+            embeds=[],
+        )
+
+
+async def run(count, render_html, directory):
+    path = os.path.join(directory, f'{count}-{render_html}.jsonl.gz')
+    writer = TranscriptWriter(path, f'ticket {count}', render_html)
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = await writer.write_history(history(count))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = os.path.getsize(path) + (os.path.getsize(writer.html_path) if writer.html_path else 0)
+    with gzip.open(path, 'rt') as file:
+        assert sum(1 for _ in file) == written == count
+    print(f'{count:>7} messages  html={str(render_html):5}  {count / elapsed:9.0f} msg/s  '
+          f'{size / 1024:8.0f} KiB  peak {peak / 2**20:6.2f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        for count in map(int, args.sizes.split(',')):
+            for render_html in (False, True):
+                asyncio.run(run(count, render_html, directory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+import asyncio
+import datetime
+import itertools
+import json
+import time
+from collections import defaultdict
+
+import discord
+from aiohttp import WSMsgType, web
+
+from fake_rest import FakeRest
+
+# a local discord: the REST routes master.py uses plus a json gateway that sends
+# READY and GUILD_CREATE for synthetic guilds and lets a harness dispatch messages,
+# DMs, member joins and slash command interactions. everything the bot sends back
+# is recorded with a timestamp so latencies can be measured from the outside.
+# sharded clients get each guild on shard (guild_id >> 22) % shard_count and DMs on shard 0.
+
+BOT_ID = 900000000000000001
+APP_ID = 900000000000000002
+OWNER_ID = 900000000000000003
+GUILD_BASE = 100000000000000000
+USER_BASE = 200000000000000000
+#interaction payloads carry resolved permissions, an administrator has every bit set
+ADMIN_PERMISSIONS = discord.Permissions.all().value
+
+
+def iso_now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def user_payload(user_id, name=None, bot=False):
+    return {'id': str(user_id), 'username': name or f'user{user_id % 100000}', 'discriminator': '0', 'global_name': None, 'avatar': None, 'bot': bot}
+
+
+def member_payload(user_id, roles=(), permissions=None):
+    payload = {'user': user_payload(user_id), 'roles': [str(role) for role in roles], 'joined_at': iso_now(), 'deaf': False, 'mute': False, 'flags': 0}
+    if permissions is not None:
+        payload['permissions'] = str(permissions)
+    return payload
+
+
+class FakeGuild:
+    def __init__(self, index, members):
+        #spread over shards the way discord does, by the timestamp bits of the id
+        self.id = GUILD_BASE + (index << 22)
+        self.staff_role = self.id + 1
+        self.category = self.id + 2
+        self.general = self.id + 3
+        self.mod_mail = self.id + 4
+        self.member_count = members
+        self.member_ids = [USER_BASE + index * 1_000_000 + n for n in range(members)]
+        self.verification_level = 0
+
+    def channel_payloads(self):
+        base = {'guild_id': str(self.id), 'position': 0, 'permission_overwrites': [], 'nsfw': False}
+        return [
+            dict(base, id=str(self.category), type=4, name='Tickets'),
+            dict(base, id=str(self.general), type=0, name='general', parent_id=None),
+            dict(base, id=str(self.mod_mail), type=0, name='mod-mail', parent_id=str(self.category)),
+        ]
+
+    def payload(self, inline_members=250):
+        role = {'hoist': False, 'managed': False, 'mentionable': False, 'color': 0}
+        return {
+            'id': str(self.id),
+            'name': f'guild {self.id}',
+            'owner_id': str(BOT_ID),
+            'member_count': self.member_count,
+            'verification_level': self.verification_level,
+            'large': False,
+            'unavailable': False,
+            'roles': [
+                dict(role, id=str(self.id), name='@everyone', permissions='0', position=0),
+                dict(role, id=str(self.staff_role), name='staff', permissions='8', position=1),
+            ],
+            'channels': self.channel_payloads(),
+            'members': [member_payload(BOT_ID)] + [member_payload(user_id) for user_id in self.member_ids[:inline_members]],
+            'presences': [],
+            'emojis': [],
+            'stickers': [],
+            'features': [],
+            'threads': [],
+            'voice_states': [],
+        }
+
+
+class FakeDiscord(FakeRest):
+    def __init__(self, guilds=1, members=100, shards=1, heartbeat_interval=41.25, heartbeat_delay=0.0, **options):
+        super().__init__(**options)
+        self.heartbeat_interval = heartbeat_interval
+        #how long a heartbeat waits for its ack, which is what the bot reports as latency
+        self.heartbeat_delay = heartbeat_delay
+        self.guilds = [FakeGuild(n, members) for n in range(guilds)]
+        self.ids = itertools.count(800000000000000000)
+        self.channels = {}
+        self.records = defaultdict(list)
+        self.unknown_routes = defaultdict(int)
+        self.presence_updates = []
+        self.identified = asyncio.Event()
+        self._changed = asyncio.Event()
+        self.recommended_shards = shards
+        self.shard_count = 1
+        self._sockets = {}
+        self._sequence = 0
+        for guild in self.guilds:
+            for channel in guild.channel_payloads():
+                self.channels[int(channel['id'])] = channel
+
+        api = '/api/v10'
+        routes = [
+            ('GET', '/oauth2/applications/@me', self.application),
+            ('GET', '/gateway/bot', self.gateway_bot),
+            ('GET', '/gateway', self.gateway_bot),
+            ('PUT', '/applications/{application_id}/commands', self.sync_commands),
+            ('POST', '/applications/{application_id}/commands', self.upsert_command),
+            ('POST', '/interactions/{interaction_id}/{token}/callback', self.interaction_callback),
+            ('POST', '/webhooks/{webhook_id}/{token}', self.followup),
+            ('PATCH', '/webhooks/{webhook_id}/{token}/messages/{message_id}', self.edit_followup),
+            ('DELETE', '/webhooks/{webhook_id}/{token}/messages/{message_id}', self.delete_followup),
+            ('POST', '/users/@me/channels', self.create_dm),
+            ('GET', '/users/{user_id}', self.get_user),
+            ('GET', '/guilds/{guild_id}/members/{user_id}', self.get_member),
+            ('PATCH', '/guilds/{guild_id}', self.edit_guild),
+            ('POST', '/guilds/{guild_id}/channels', self.create_channel),
+            ('PATCH', '/channels/{channel_id}', self.edit_channel),
+            ('DELETE', '/channels/{channel_id}', self.delete_channel),
+            ('PUT', '/channels/{channel_id}/permissions/{overwrite_id}', self.no_content),
+            ('DELETE', '/channels/{channel_id}/permissions/{overwrite_id}', self.no_content),
+            ('GET', '/channels/{channel_id}/messages', self.history),
+            ('POST', '/channels/{channel_id}/messages', self.send_message),
+            ('PATCH', '/channels/{channel_id}/messages/{message_id}', self.edit_message),
+            ('DELETE', '/channels/{channel_id}/messages/{message_id}', self.no_content),
+            ('POST', '/channels/{channel_id}/messages/bulk-delete', self.no_content),
+        ]
+        for method, path, handler in routes:
+            self.app.router.add_route(method, api + path, handler)
+        self.app.router.add_get('/gateway', self.gateway)
+        self.app.router.add_route('*', '/{tail:.*}', self.unknown)
+
+    #recording
+    def record(self, key, content):
+        self.records[key].append((time.perf_counter(), content))
+        self._changed.set()
+
+    async def wait_for(self, predicate, timeout=60.0):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError('condition not met before timeout')
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), min(remaining, 0.5))
+            except asyncio.TimeoutError:
+                pass
+
+    def message_payload(self, channel_id, content, author=None, embeds=None):
+        channel = self.channels.get(int(channel_id), {})
+        payload = {
+            'id': str(next(self.ids)),
+            'channel_id': str(channel_id),
+            'author': author or user_payload(BOT_ID, 'bench-bot', bot=True),
+            'content': content or '',
+            'timestamp': iso_now(),
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [],
+            'mention_roles': [],
+            'attachments': [],
+            'embeds': embeds or [],
+            'pinned': False,
+            'type': 0,
+            'flags': 0,
+            'components': [],
+        }
+        if channel.get('guild_id'):
+            payload['guild_id'] = channel['guild_id']
+        return payload
+
+    async def body(self, request):
+        if request.content_type == 'application/json':
+            return await request.json()
+        if request.content_type.startswith('multipart/'):
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == 'payload_json':
+                    return json.loads(await part.text())
+        return {}
+
+    #gateway
+    async def gateway(self, request):
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        await socket.send_json({'op': 10, 'd': {'heartbeat_interval': int(self.heartbeat_interval * 1000)}})
+        async for message in socket:
+            if message.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(message.data)
+            op = payload['op']
+            if op == 1:
+                if self.heartbeat_delay:
+                    await asyncio.sleep(self.heartbeat_delay)
+                await socket.send_json({'op': 11})
+            elif op == 2:
+                await self.identify(socket, payload['d'].get('shard') or [0, 1])
+            elif op == 3:
+                self.presence_updates.append((time.perf_counter(), payload['d']))
+                self._changed.set()
+            elif op == 8:
+                data = payload['d']
+                await self.dispatch('GUILD_MEMBERS_CHUNK', {
+                    'guild_id': data['guild_id'], 'members': [], 'chunk_index': 0, 'chunk_count': 1, 'nonce': data.get('nonce'),
+                })
+        return socket
+
+    def shard_for(self, guild_id):
+        return (int(guild_id) >> 22) % self.shard_count if guild_id else 0
+
+    async def identify(self, socket, shard):
+        shard_id, self.shard_count = shard
+        self._sockets[shard_id] = socket
+        guilds = [guild for guild in self.guilds if self.shard_for(guild.id) == shard_id]
+        await self.dispatch('READY', {
+            'v': 10,
+            'user': user_payload(BOT_ID, 'bench-bot', bot=True),
+            'guilds': [{'id': str(guild.id), 'unavailable': True} for guild in guilds],
+            'session_id': 'bench',
+            'shard': [shard_id, self.shard_count],
+            'resume_gateway_url': f'ws://{self.host}:{self.port}/gateway',
+            'application': {'id': str(APP_ID), 'flags': 0},
+            'private_channels': [],
+        }, socket)
+        for guild in guilds:
+            #channels the bot created survive a reconnect or restart
+            payload = guild.payload()
+            payload['channels'] = [channel for channel in self.channels.values() if channel.get('guild_id') == str(guild.id)]
+            await self.dispatch('GUILD_CREATE', payload, socket)
+        if len(self._sockets) == self.shard_count:
+            self.identified.set()
+
+    async def dispatch(self, event, data, socket=None):
+        socket = socket or self._sockets[self.shard_for(data.get('guild_id'))]
+        self._sequence += 1
+        await socket.send_str(json.dumps({'op': 0, 't': event, 's': self._sequence, 'd': data}))
+
+    #what a harness sends
+    async def send_interaction(self, guild, user_id, name, options=None, roles=(), permissions=ADMIN_PERMISSIONS):
+        interaction_id = next(self.ids)
+        await self.dispatch('INTERACTION_CREATE', {
+            'id': str(interaction_id),
+            'application_id': str(APP_ID),
+            'type': 2,
+            'token': f'token-{interaction_id}',
+            'version': 1,
+            'guild_id': str(guild.id),
+            'channel': {'id': str(guild.general), 'type': 0},
+            'channel_id': str(guild.general),
+            'member': member_payload(user_id, roles, permissions=permissions),
+            'app_permissions': str(ADMIN_PERMISSIONS),
+            'attachment_size_limit': 8 * 1024 * 1024,
+            'locale': 'en-US',
+            'data': {
+                'id': str(next(self.ids)),
+                'name': name,
+                'type': 1,
+                'options': [{'name': key, 'type': 3, 'value': value} for key, value in (options or {}).items()],
+            },
+        })
+        return interaction_id
+
+    async def user_message(self, channel_id, user_id, content, guild=None):
+        payload = self.message_payload(channel_id, content, author=user_payload(user_id))
+        if guild is not None:
+            payload['member'] = member_payload(user_id)
+            del payload['member']['user']
+        else:
+            payload.pop('guild_id', None)
+        await self.dispatch('MESSAGE_CREATE', payload)
+
+    async def user_dm(self, user_id, content):
+        channel_id = user_id + 1
+        self.channels.setdefault(channel_id, {'id': str(channel_id), 'type': 1, 'recipients': [user_payload(user_id)]})
+        await self.user_message(channel_id, user_id, content)
+
+    async def member_join(self, guild, user_id):
+        payload = member_payload(user_id)
+        payload['guild_id'] = str(guild.id)
+        await self.dispatch('GUILD_MEMBER_ADD', payload)
+
+    #REST handlers
+    async def me(self, request):
+        return web.json_response(user_payload(BOT_ID, 'ticketbot', bot=True))
+
+    async def application(self, request):
+        return web.json_response({
+            'id': str(APP_ID), 'name': 'bench', 'description': '', 'icon': None, 'bot_public': True,
+            'bot_require_code_grant': False, 'verify_key': '', 'owner': user_payload(OWNER_ID), 'flags': 0,
+        })
+
+    async def gateway_bot(self, request):
+        return web.json_response({
+            'url': f'ws://{self.host}:{self.port}/gateway', 'shards': self.recommended_shards,
+            'session_start_limit': {'total': 1000, 'remaining': 1000, 'reset_after': 0, 'max_concurrency': 1},
+        })
+
+    async def sync_commands(self, request):
+        self.record('sync', None)
+        return web.json_response([])
+
+    async def upsert_command(self, request):
+        payload = await self.body(request)
+        self.record('upsert', payload['name'])
+        return web.json_response(dict(payload, id=str(next(self.ids)), application_id=str(APP_ID), version='1'))
+
+    async def interaction_callback(self, request):
+        body = await self.body(request)
+        data = body.get('data') or {}
+        interaction_id = request.match_info['interaction_id']
+        embeds = data.get('embeds') or [{}]
+        self.record(('callback', int(interaction_id)), data.get('content') or embeds[0].get('description') or embeds[0].get('title'))
+        return web.json_response({
+            'interaction': {
+                'id': interaction_id, 'type': 2,
+                'response_message_loading': body.get('type') == 5,
+                'response_message_ephemeral': bool(data.get('flags', 0) & 64),
+            },
+        })
+
+    async def followup(self, request):
+        body = await self.body(request)
+        token = request.match_info['token']
+        embeds = body.get('embeds') or [{}]
+        self.record(('followup', token), body.get('content') or embeds[0].get('description') or embeds[0].get('title'))
+        self.record(('followup_ephemeral', token), bool(body.get('flags', 0) & 64))
+        return web.json_response(self.message_payload(next(iter(self.channels)), body.get('content')))
+
+    async def edit_followup(self, request):
+        body = await self.body(request)
+        self.record(('followup', request.match_info['token']), body.get('content'))
+        return web.json_response(self.message_payload(next(iter(self.channels)), body.get('content')))
+
+    async def delete_followup(self, request):
+        self.record(('followup_delete', request.match_info['token']), request.match_info['message_id'])
+        return web.Response(status=204)
+
+    async def create_dm(self, request):
+        body = await self.body(request)
+        recipient = int(body['recipient_id'])
+        channel = {'id': str(recipient + 1), 'type': 1, 'recipients': [user_payload(recipient)]}
+        self.channels[recipient + 1] = channel
+        return web.json_response(channel)
+
+    async def get_user(self, request):
+        return web.json_response(user_payload(int(request.match_info['user_id'])))
+
+    async def get_member(self, request):
+        return web.json_response(member_payload(int(request.match_info['user_id'])))
+
+    async def edit_guild(self, request):
+        body = await self.body(request)
+        self.record(('guild', int(request.match_info['guild_id'])), body)
+        guild = next(guild for guild in self.guilds if guild.id == int(request.match_info['guild_id']))
+        guild.verification_level = body.get('verification_level', guild.verification_level)
+        payload = guild.payload(inline_members=0)
+        await self.dispatch('GUILD_UPDATE', payload, self._sockets[self.shard_for(guild.id)])
+        return web.json_response(payload)
+
+    async def create_channel(self, request):
+        body = await self.body(request)
+        channel = {
+            'id': str(next(self.ids)),
+            'type': body.get('type', 0),
+            'guild_id': request.match_info['guild_id'],
+            'name': body.get('name', 'channel'),
+            'position': 0,
+            'parent_id': body.get('parent_id'),
+            'permission_overwrites': body.get('permission_overwrites', []),
+            'nsfw': False,
+        }
+        self.channels[int(channel['id'])] = channel
+        self.record(('channel_create', int(channel['guild_id'])), channel)
+        await self.dispatch('CHANNEL_CREATE', channel)
+        return web.json_response(channel)
+
+    async def edit_channel(self, request):
+        channel = self.channels[int(request.match_info['channel_id'])]
+        channel.update({key: value for key, value in (await self.body(request)).items() if key in ('name', 'parent_id', 'topic')})
+        await self.dispatch('CHANNEL_UPDATE', channel)
+        return web.json_response(channel)
+
+    async def delete_channel(self, request):
+        channel = self.channels.pop(int(request.match_info['channel_id']))
+        await self.dispatch('CHANNEL_DELETE', channel)
+        return web.json_response(channel)
+
+    async def history(self, request):
+        return web.json_response([])
+
+    async def send_message(self, request):
+        body = await self.body(request)
+        channel_id = int(request.match_info['channel_id'])
+        self.record(('message', channel_id), body.get('content'))
+        return web.json_response(self.message_payload(channel_id, body.get('content'), embeds=body.get('embeds')))
+
+    async def edit_message(self, request):
+        body = await self.body(request)
+        channel_id = int(request.match_info['channel_id'])
+        self.record(('message', channel_id), body.get('content'))
+        return web.json_response(self.message_payload(channel_id, body.get('content')))
+
+    async def no_content(self, request):
+        return web.Response(status=204)
+
+    async def unknown(self, request):
+        self.unknown_routes[f'{request.method} {request.path}'] += 1
+        return web.json_response({'message': 'Unknown route', 'code': 0}, status=404)
@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+# a local stand-in for the parts of discord's REST api the benchmarks use.
+# every route gets a fixed-window bucket per major parameter and answers with
+# discord's rate limit headers, or a 429 once the bucket is empty. inject_429 adds
+# random 429s on top. ids divisible by not_found_every 404 on ban and kick.
+
+MAJOR_PARAMETERS = ('guild_id', 'channel_id', 'webhook_id', 'interaction_id')
+UNLIMITED = {'/api/v10/users/@me', '/api/v10/oauth2/applications/@me', '/api/v10/gateway/bot', '/api/v10/gateway'}
+
+
+class Bucket:
+    def __init__(self, name, limit, per):
+        self.name = name
+        self.limit = limit
+        self.per = per
+        self.reset_at = 0.0
+        self.remaining = limit
+
+    def take(self):
+        now = time.time()
+        if now >= self.reset_at:
+            self.reset_at = now + self.per
+            self.remaining = self.limit
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    def headers(self):
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': f'{self.reset_at:.3f}',
+            'X-RateLimit-Reset-After': f'{max(self.reset_at - time.time(), 0):.3f}',
+            'X-RateLimit-Bucket': self.name,
+        }
+
+
+class FakeRest:
+    def __init__(self, limit=50, per=1.0, latency=0.0, not_found_every=0, inject_429=0.0, seed=1, route_latency=None):
+        self.limit = limit
+        self.per = per
+        self.latency = latency
+        #'METHOD /api/v10/path/{param}' -> seconds, overrides latency for that route
+        self.route_latency = route_latency or {}
+        self.not_found_every = not_found_every
+        self.inject_429 = inject_429
+        self.random = random.Random(seed)
+        self.buckets = {}
+        self.calls = 0
+        self.rate_limited = 0
+        self.route_calls = {}
+        self.bans = set()
+        self.app = web.Application(middlewares=[self.plain_json, self.rate_limit])
+        self.app.router.add_get('/api/v10/users/@me', self.me)
+        self.app.router.add_put('/api/v10/guilds/{guild_id}/bans/{user_id}', self.ban)
+        self.app.router.add_delete('/api/v10/guilds/{guild_id}/bans/{user_id}', self.unban)
+        self.app.router.add_post('/api/v10/guilds/{guild_id}/bulk-ban', self.bulk_ban)
+        self.app.router.add_delete('/api/v10/guilds/{guild_id}/members/{user_id}', self.kick)
+        self._runner = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.host = host
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f'http://{host}:{self.port}/api/v10'
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    def bucket_for(self, request):
+        route = f'{request.method} {request.match_info.route.resource.canonical}'
+        major = tuple(request.match_info.get(name) for name in MAJOR_PARAMETERS)
+        bucket = self.buckets.get((route, major))
+        if bucket is None:
+            bucket = self.buckets[(route, major)] = Bucket(f'bucket-{len(self.buckets)}', self.limit, self.per)
+        return route, bucket
+
+    #discord.py only parses bodies whose content type is exactly application/json
+    @web.middleware
+    async def plain_json(self, request, handler):
+        response = await handler(request)
+        if isinstance(response, web.Response) and response.content_type == 'application/json':
+            response.charset = None
+        return response
+
+    @web.middleware
+    async def rate_limit(self, request, handler):
+        if request.path in UNLIMITED or request.match_info.route.resource is None or request.headers.get('Upgrade'):
+            return await handler(request)
+        self.calls += 1
+        route, bucket = self.bucket_for(request)
+        self.route_calls[route] = self.route_calls.get(route, 0) + 1
+        injected = self.inject_429 and self.random.random() < self.inject_429
+        if injected or not bucket.take():
+            self.rate_limited += 1
+            retry_after = 0.05 if injected else max(bucket.reset_at - time.time(), 0.001)
+            headers = bucket.headers()
+            headers['Retry-After'] = f'{retry_after:.3f}'
+            #discord.py reads a 429 without a Via header as a cloudflare ban and gives up
+            headers['Via'] = '1.1 google'
+            return web.json_response(
+                {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': False},
+                status=429, headers=headers
+            )
+        latency = self.route_latency.get(route, self.latency)
+        if latency:
+            await asyncio.sleep(latency)
+        response = await handler(request)
+        response.headers.update(bucket.headers())
+        return response
+
+    def missing(self, request):
+        return self.not_found_every and int(request.match_info['user_id']) % self.not_found_every == 0
+
+    async def me(self, request):
+        return web.json_response({'id': '1', 'username': 'bench', 'discriminator': '0', 'avatar': None})
+
+    async def ban(self, request):
+        if self.missing(request):
+            return web.json_response({'message': 'Unknown User', 'code': 10013}, status=404)
+        self.bans.add(request.match_info['user_id'])
+        return web.Response(status=204)
+
+    async def bulk_ban(self, request):
+        user_ids = (await request.json())['user_ids']
+        failed = [user_id for user_id in user_ids if self.not_found_every and int(user_id) % self.not_found_every == 0]
+        banned = [user_id for user_id in user_ids if user_id not in failed]
+        self.bans.update(banned)
+        return web.json_response({'banned_users': banned, 'failed_users': failed})
+
+    async def unban(self, request):
+        if request.match_info['user_id'] not in self.bans:
+            return web.json_response({'message': 'Unknown Ban', 'code': 10026}, status=404)
+        self.bans.discard(request.match_info['user_id'])
+        return web.Response(status=204)
+
+    async def kick(self, request):
+        if self.missing(request):
+            return web.json_response({'message': 'Unknown Member', 'code': 10007}, status=404)
+        return web.Response(status=204)
@@ -0,0 +1,100 @@
+import asyncio
+import re
+
+import discord
+
+# bulk moderation: ids are parsed from text or an attachment and the action runs
+# through a fixed number of workers. discord.py already waits on per-route buckets,
+# the workers bound how many requests are in flight and retry 429s and 5xxs it gives up on.
+
+ID_PATTERN = re.compile(r'\b\d{15,20}\b')
+
+
+class TargetForbidden(Exception):
+    pass
+
+
+def parse_ids(*sources):
+    seen = set()
+    ids = []
+    for text in sources:
+        for match in ID_PATTERN.findall(text or ''):
+            user_id = int(match)
+            if user_id not in seen:
+                seen.add(user_id)
+                ids.append(user_id)
+    return ids
+
+
+class BulkResult:
+    def __init__(self, total):
+        self.total = total
+        self.succeeded = []
+        self.not_found = []
+        self.forbidden = []
+        self.failed = []
+
+    @property
+    def done(self):
+        return len(self.succeeded) + len(self.not_found) + len(self.forbidden) + len(self.failed)
+
+    def counts(self):
+        return f'{len(self.succeeded)} succeeded, {len(self.not_found)} not found, {len(self.forbidden)} forbidden, {len(self.failed)} failed'
+
+    def progress(self, verb):
+        return f'`{verb}: {self.done}/{self.total} ({self.counts()})`'
+
+    def summary(self, verb):
+        lines = [f'`{verb} finished: {self.counts()}`']
+        for label, ids in (('Not found', self.not_found), ('Forbidden', self.forbidden), ('Failed', self.failed)):
+            if ids:
+                shown = ', '.join(map(str, ids[:20]))
+                lines.append(f'`{label}: {shown}{" ..." if len(ids) > 20 else ""}`')
+        return '\n'.join(lines)
+
+
+async def run_bulk(ids, action, concurrency=5, progress=None, interval=2.0, retries=3):
+    result = BulkResult(len(ids))
+    pending = iter(ids)
+
+    async def attempt(user_id):
+        for attempt_number in range(retries + 1):
+            try:
+                await action(user_id)
+                result.succeeded.append(user_id)
+                return
+            except discord.NotFound:
+                result.not_found.append(user_id)
+                return
+            except (discord.Forbidden, TargetForbidden):
+                result.forbidden.append(user_id)
+                return
+            except discord.RateLimited as e:
+                delay = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    break
+                delay = 2 ** attempt_number
+            if attempt_number < retries:
+                await asyncio.sleep(delay)
+        result.failed.append(user_id)
+
+    async def worker():
+        for user_id in pending:
+            await attempt(user_id)
+
+    async def report():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await progress(result)
+            except discord.HTTPException:
+                pass
+
+    reporter = asyncio.create_task(report()) if progress else None
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(ids))))))
+    finally:
+        if reporter:
+            reporter.cancel()
+    return result
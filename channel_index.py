@@ -0,0 +1,78 @@
+import difflib
+
+# per-guild name -> channel index for commands that take a channel or category by name.
+# built lazily from the guild's cached channels and kept current by channel events.
+# exact lookups are case-insensitive dict hits; misses get a short ranked list of
+# close names instead of every channel in the guild.
+
+
+class ChannelIndex:
+    def __init__(self):
+        self._guilds = {}
+
+    def _build(self, guild):
+        names = {}
+        for channel in guild.channels:
+            names.setdefault(channel.name.lower(), set()).add(channel.id)
+        self._guilds[guild.id] = names
+        return names
+
+    def _names(self, guild):
+        names = self._guilds.get(guild.id)
+        return names if names is not None else self._build(guild)
+
+    def add(self, channel):
+        if channel.guild.id in self._guilds:
+            self._guilds[channel.guild.id].setdefault(channel.name.lower(), set()).add(channel.id)
+
+    def remove(self, channel, name=None):
+        names = self._guilds.get(channel.guild.id)
+        if names is None:
+            return
+        key = (name or channel.name).lower()
+        ids = names.get(key)
+        if ids:
+            ids.discard(channel.id)
+            if not ids:
+                del names[key]
+
+    def rename(self, before, after):
+        if before.name != after.name:
+            self.remove(before)
+            self.add(after)
+
+    def drop_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    def _resolve(self, guild, ids, kind):
+        for channel_id in sorted(ids):
+            channel = guild.get_channel(channel_id)
+            if channel is not None and (kind is None or isinstance(channel, kind)):
+                return channel
+        return None
+
+    def get(self, guild, name, kind=None):
+        ids = self._names(guild).get(name.lower().lstrip('#'))
+        return self._resolve(guild, ids, kind) if ids else None
+
+    def _candidates(self, guild, kind):
+        names = self._names(guild)
+        if kind is None:
+            return list(names)
+        return [name for name, ids in names.items() if self._resolve(guild, ids, kind)]
+
+    def suggest(self, guild, name, kind=None, limit=5):
+        return difflib.get_close_matches(name.lower().lstrip('#'), self._candidates(guild, kind), n=limit, cutoff=0.4)
+
+    #prefix matches first, then substring matches, then close matches
+    def complete(self, guild, current, kind=None, limit=25):
+        current = current.lower().lstrip('#')
+        candidates = self._candidates(guild, kind)
+        if not current:
+            return sorted(candidates)[:limit]
+        prefix = sorted(name for name in candidates if name.startswith(current))
+        contains = sorted(name for name in candidates if current in name and not name.startswith(current))
+        ranked = (prefix + contains)[:limit]
+        if len(ranked) < limit:
+            ranked += [name for name in difflib.get_close_matches(current, candidates, n=limit, cutoff=0.5) if name not in ranked]
+        return ranked[:limit]
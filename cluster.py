@@ -0,0 +1,167 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+# cluster mode: `python cluster.py` starts CLUSTER_COUNT copies of master.py, each running
+# an AutoShardedBot over its own contiguous range of SHARD_COUNT shards, and restarts
+# any that exit. the processes share the sqlite database; per-guild rows never overlap
+# since a guild lives on exactly one shard. discord sends every DM to shard 0, so the
+# process holding shard 0 is the primary: it runs the owner DM relay and the command sync.
+
+API_BASE = 'https://discord.com/api/v10'
+IDENTIFY_INTERVAL = 5.0
+
+
+def parse_shard_ids(text):
+    shard_ids = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            shard_ids.extend(range(int(first), int(last) + 1))
+        elif part.strip():
+            shard_ids.append(int(part))
+    return shard_ids
+
+
+def shard_ranges(shard_count, clusters):
+    per_cluster, extra = divmod(shard_count, clusters)
+    ranges = []
+    first = 0
+    for cluster_id in range(clusters):
+        size = per_cluster + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(first, first + size)))
+        first += size
+    return ranges
+
+
+class ClusterConfig:
+    def __init__(self, shard_count=None, shard_ids=None, cluster_id=0, cluster_count=1):
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+
+    @classmethod
+    def from_env(cls):
+        shard_count = os.getenv('SHARD_COUNT')
+        shard_ids = os.getenv('SHARD_IDS')
+        return cls(
+            shard_count=int(shard_count) if shard_count else None,
+            shard_ids=parse_shard_ids(shard_ids) if shard_ids else None,
+            cluster_id=int(os.getenv('CLUSTER_ID', '0')),
+            cluster_count=int(os.getenv('CLUSTER_COUNT', '1')),
+        )
+
+    @property
+    def sharded(self):
+        return self.shard_count is not None
+
+    @property
+    def primary(self):
+        return not self.shard_ids or 0 in self.shard_ids
+
+    def bot_options(self):
+        if not self.sharded:
+            return {}
+        options = {'shard_count': self.shard_count}
+        if self.shard_ids:
+            options['shard_ids'] = self.shard_ids
+        return options
+
+    def describe(self):
+        if not self.sharded:
+            return 'unsharded'
+        shards = ','.join(map(str, self.shard_ids)) if self.shard_ids else 'all'
+        return f'cluster {self.cluster_id}/{self.cluster_count}, shards {shards} of {self.shard_count}'
+
+
+async def recommended_shards(token, api_base=API_BASE):
+    async with aiohttp.ClientSession(headers={'Authorization': f'Bot {token}'}) as session:
+        async with session.get(f'{api_base}/gateway/bot') as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data['shards'], data['session_start_limit']['max_concurrency']
+
+
+class Launcher:
+    def __init__(self, script, shard_count, clusters, max_concurrency=1, restart_delay=5.0):
+        self.script = script
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, clusters)
+        self.max_concurrency = max_concurrency
+        self.restart_delay = restart_delay
+        self._processes = {}
+        self._stopping = False
+
+    def _env(self, cluster_id):
+        env = dict(
+            os.environ,
+            SHARD_COUNT=str(self.shard_count),
+            SHARD_IDS=','.join(map(str, self.ranges[cluster_id])),
+            CLUSTER_ID=str(cluster_id),
+            CLUSTER_COUNT=str(len(self.ranges)),
+        )
+        #one metrics port per process
+        if os.getenv('METRICS_PORT', '0') != '0':
+            env['METRICS_PORT'] = str(int(os.getenv('METRICS_PORT')) + cluster_id)
+        return env
+
+    #discord allows max_concurrency identifies per 5s, so each cluster waits for the shards before it
+    def _identify_time(self, cluster_id):
+        return -(-len(self.ranges[cluster_id]) // self.max_concurrency) * IDENTIFY_INTERVAL
+
+    async def _supervise(self, cluster_id, delay):
+        await asyncio.sleep(delay)
+        backoff = self.restart_delay
+        while not self._stopping:
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(sys.executable, self.script, env=self._env(cluster_id))
+            self._processes[cluster_id] = process
+            print(f'Cluster {cluster_id} started (pid {process.pid}, shards {self.ranges[cluster_id]})')
+            code = await process.wait()
+            if self._stopping:
+                break
+            #a process that ran for a while gets restarted quickly, one that keeps crashing backs off
+            backoff = self.restart_delay if time.monotonic() - started > 60 else min(backoff * 2, 300)
+            print(f'Cluster {cluster_id} exited with code {code}, restarting in {backoff:.0f}s')
+            await asyncio.sleep(backoff)
+
+    def stop(self):
+        self._stopping = True
+        for process in self._processes.values():
+            if process.returncode is None:
+                process.terminate()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+        delay = 0.0
+        tasks = []
+        for cluster_id in range(len(self.ranges)):
+            tasks.append(asyncio.create_task(self._supervise(cluster_id, delay)))
+            delay += self._identify_time(cluster_id)
+        await asyncio.gather(*tasks)
+        await asyncio.gather(*(process.wait() for process in self._processes.values()))
+
+
+async def main():
+    load_dotenv()
+    clusters = int(os.getenv('CLUSTER_COUNT', '2'))
+    shard_count = os.getenv('SHARD_COUNT', 'auto')
+    max_concurrency = 1
+    if shard_count == 'auto':
+        shard_count, max_concurrency = await recommended_shards(os.getenv('TOKEN'), os.getenv('DISCORD_API_BASE', API_BASE))
+    shard_count = max(int(shard_count), clusters)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'master.py')
+    print(f'Starting {clusters} clusters over {shard_count} shards')
+    await Launcher(script, shard_count, clusters, max_concurrency).run()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,8 @@
+# the bot's features as discord.py extensions, loaded by master.py in setup_hook.
+# anything that has to outlive a reload (the settings store, ticket registry, idle
+# reaper, caches, running purges) is created once in master.py and hung on the bot;
+# the cogs only hold code and read that state through self.bot. an owner can then
+# `!reload tickets` to swap the code without a new gateway connection or member
+# chunking, and only the slash commands whose payload changed are synced again.
+
+EXTENSIONS = ('tickets', 'moderation', 'utility', 'owner')
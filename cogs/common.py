@@ -0,0 +1,48 @@
+import datetime
+
+import discord
+from discord import Interaction, app_commands
+
+# helpers shared by the cogs. not an extension itself, so changes here need a restart.
+
+EMBEDCOLOR = 0xE7E7E7
+
+
+def timestamp():
+    return datetime.datetime.now().strftime("%m-%d %H:%M")
+
+def date():
+    return datetime.datetime.now().strftime("%m-%d-%Y %H:%M")
+
+#checks
+def has_admin_permissions(ctx):
+    return ctx.author.guild_permissions.administrator
+
+def has_mod_permissions(ctx):
+    required_permissions = discord.Permissions(kick_members=True, ban_members=True)
+    return ctx.author.guild_permissions >= required_permissions
+
+def is_bot_owner(ctx):
+    return ctx.author.id == ctx.bot.owner_id
+
+#channel/category lookup by mention or name
+def resolve_channel(channel_index, guild, reference, kind):
+    if reference.startswith("<#") and reference.endswith(">") and reference[2:-1].isdigit():
+        channel = guild.get_channel(int(reference[2:-1]))
+        return channel if isinstance(channel, kind) else None
+    return channel_index.get(guild, reference, kind)
+
+def not_found_message(channel_index, label, guild, reference, kind):
+    suggestions = channel_index.suggest(guild, reference, kind)
+    if suggestions:
+        return f'`{label} {reference} not found. Did you mean: {", ".join(suggestions)}?`'
+    return f'`{label} {reference} not found.`'
+
+def channel_autocomplete(kind):
+    async def autocomplete(interaction: Interaction, current: str):
+        if interaction.guild is None:
+            return []
+        channel_index = interaction.client.channel_index
+        channels = (channel_index.get(interaction.guild, name, kind) for name in channel_index.complete(interaction.guild, current, kind))
+        return [app_commands.Choice(name=channel.name, value=channel.name) for channel in channels if channel]
+    return autocomplete
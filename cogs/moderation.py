@@ -0,0 +1,479 @@
+import os
+import re
+import time
+
+import discord
+from discord.ext import commands
+from discord import Interaction, app_commands
+
+from bulk import TargetForbidden, parse_ids, run_bulk
+from cogs.common import EMBEDCOLOR, has_admin_permissions, has_mod_permissions, timestamp
+from intents import get_or_fetch_member
+from purge import PurgeFilter, PurgeJob
+from storage import MOD_ACTIONS
+
+BULK_CONCURRENCY = int(os.getenv('BULK_CONCURRENCY', '5'))
+BULK_MAX_IDS = int(os.getenv('BULK_MAX_IDS', '1000'))
+PURGE_MAX = int(os.getenv('PURGE_MAX', '5000'))
+PURGE_SCAN_LIMIT = int(os.getenv('PURGE_SCAN_LIMIT', '20000'))
+MODLOG_PAGE = 10
+#discord takes at most 200 users per bulk ban request
+RAID_BAN_CHUNK = 200
+RAID_VERIFICATION = discord.VerificationLevel.high
+RAID_ACTIONS = ('status', 'start', 'kick', 'ban', 'end')
+
+
+class PurgeFlags(commands.FlagConverter, prefix='--', delimiter=' '):
+    user: discord.User = None
+    contains: str = None
+    attachments: bool = None
+    before: int = None
+    after: int = None
+
+
+#cache-only rank check for raid suspects, they joined moments ago so a fetch per suspect buys nothing
+def outranks_cached(interaction, user_id):
+    member = interaction.guild.get_member(user_id)
+    return user_id == interaction.user.id or (member is not None and member.top_role >= interaction.user.top_role)
+
+#the member cache may be empty, only a user discord says is not in the guild skips the rank check
+async def check_outranks(interaction, user_id):
+    if user_id == interaction.user.id:
+        raise TargetForbidden(user_id)
+    member = await get_or_fetch_member(interaction.guild, user_id)
+    if member is not None and member.top_role >= interaction.user.top_role:
+        raise TargetForbidden(user_id)
+
+#moderation history
+def modlog_line(entry):
+    line = f'`#{entry.id}` <t:{int(entry.created_at)}:R> **{entry.action}**'
+    if entry.target_id:
+        line += f' <@{entry.target_id}>'
+    if entry.moderator_id and entry.moderator_id != entry.target_id:
+        line += f' by <@{entry.moderator_id}>'
+    if entry.reason:
+        line += f' - {entry.reason[:100]}'
+    if entry.detail:
+        line += f' ({entry.detail[:100]})'
+    return line
+
+async def modlog_page(mod_mail_store, guild, filters, cursor):
+    entries = await mod_mail_store.mod_actions(guild.id, before=cursor, limit=MODLOG_PAGE + 1, **filters)
+    page = entries[:MODLOG_PAGE]
+    embed = discord.Embed(
+        title='MOD LOG',
+        description='\n'.join(modlog_line(entry) for entry in page) or 'No matching entries.',
+        color=discord.Color(EMBEDCOLOR)
+    )
+    next_cursor = page[-1].id if len(entries) > MODLOG_PAGE else None
+    if next_cursor:
+        embed.set_footer(text=f'Older entries: /modlog cursor:{next_cursor}')
+    return embed, next_cursor
+
+
+class ModLogView(discord.ui.View):
+    def __init__(self, author_id, filters, cursor):
+        super().__init__(timeout=300)
+        self.author_id = author_id
+        self.filters = filters
+        self.cursor = cursor
+
+    @discord.ui.button(label='Older', style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: Interaction, button: discord.ui.Button):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message('`Run /modlog to page through the log yourself.`', ephemeral=True, delete_after=5)
+            return
+        embed, self.cursor = await modlog_page(interaction.client.mod_mail_store, interaction.guild, self.filters, self.cursor)
+        button.disabled = self.cursor is None
+        await interaction.response.edit_message(embed=embed, view=self)
+
+
+class Moderation(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.mod_mail_store = bot.mod_mail_store
+        #running purges live on the bot so `purge cancel` still finds them after a reload
+        self.purge_jobs = bot.purge_jobs
+        self.raid_guard = bot.raid_guard
+
+    #name for messages, only from cache since ban/unban work on the bare ID
+    def describe_user(self, user_id):
+        return self.bot.user_resolver.peek(int(user_id)) or 'User'
+
+    #purge command
+    @commands.command()
+    @commands.guild_only()
+    @commands.check(has_mod_permissions or has_admin_permissions)
+    async def purge(self, ctx, amount: str, *, flags: PurgeFlags):
+        if amount == 'cancel':
+            job = self.purge_jobs.get(ctx.channel.id)
+            if job:
+                job.cancel()
+            await ctx.send('`Purge cancelled.`' if job else '`No purge is running in this channel.`', delete_after=10)
+            return
+        if not amount.isdigit() or not 1 <= int(amount) <= PURGE_MAX:
+            await ctx.send(f'`Please provide a number between 1 and {PURGE_MAX} for the amount of messages to delete.`', delete_after=10)
+            return
+        if ctx.channel.id in self.purge_jobs:
+            await ctx.send(f'`A purge is already running here, use {ctx.prefix}purge cancel to stop it.`', delete_after=10)
+            return
+        try:
+            purge_filter = PurgeFilter(
+                author_id=flags.user.id if flags.user else None,
+                pattern=flags.contains,
+                attachments=flags.attachments
+            )
+        except re.error as e:
+            await ctx.send(f'`Invalid --contains pattern: {e}`', delete_after=10)
+            return
+        job = PurgeJob(
+            ctx.channel,
+            int(amount),
+            purge_filter,
+            before=discord.Object(flags.before) if flags.before else ctx.message,
+            after=discord.Object(flags.after) if flags.after else None,
+            scan_limit=PURGE_SCAN_LIMIT
+        )
+        self.purge_jobs[ctx.channel.id] = job
+        try:
+            await ctx.message.delete()
+            status = await ctx.send(job.status())
+
+            async def progress(job):
+                await status.edit(content=job.status())
+
+            await job.run(progress)
+            self.mod_mail_store.log_action(
+                ctx.guild.id, 'purge', flags.user.id if flags.user else None, ctx.author.id,
+                detail=f'{job.deleted} messages in #{ctx.channel.name}'
+            )
+            await status.edit(content=f'`Deleted {job.deleted} messages{" (cancelled)" if job.cancelled else ""}.`', delete_after=10)
+        except discord.errors.Forbidden:
+            await ctx.send("`You do not have permission to delete messages in this channel.`", delete_after=10)
+        except Exception as e:
+            await ctx.send(f'`An error occurred: {e}`', delete_after=10)
+        finally:
+            self.purge_jobs.pop(ctx.channel.id, None)
+
+    #ban commands
+    @app_commands.command(
+        name='ban',
+        description='Ban a member',
+        extras={'defer': 'ephemeral'}
+    )
+    @app_commands.default_permissions(kick_members=True, ban_members=True)
+    @app_commands.checks.has_permissions(kick_members=True, ban_members=True)
+    async def ban(self, interaction: Interaction, member: discord.Member, reason: str = None):
+        if interaction.user.top_role.position > member.top_role.position:
+            await member.ban(reason=reason)
+            await interaction.response.send_message(f'`{member} has been banned.`')
+            self.mod_mail_store.log_action(interaction.guild.id, 'ban', member.id, interaction.user.id, reason)
+            print(f'{timestamp()} | {member} has been banned by {interaction.user} in {interaction.guild} for {reason}')
+        else:
+            await interaction.response.send_message("`You do not have permission to ban this member.`", ephemeral=True, delete_after=5)
+
+    @app_commands.command(name='banid', description='ban a user by ID', extras={'defer': 'ephemeral'})
+    @app_commands.default_permissions(kick_members=True, ban_members=True)
+    @app_commands.checks.has_permissions(kick_members=True, ban_members=True)
+    async def banid(self, interaction: Interaction, user_id: str, reason: str = None):
+        try:
+            banned_user = self.describe_user(user_id)
+            await interaction.guild.ban(discord.Object(int(user_id)), reason=reason)
+            await interaction.response.send_message(f'`{banned_user} (ID: {user_id}) has been banned.`')
+            self.mod_mail_store.log_action(interaction.guild.id, 'ban', int(user_id), interaction.user.id, reason)
+            print(f'{timestamp()} | {banned_user} (ID: {user_id}) has been banned by {interaction.user} in {interaction.guild} for {reason}')
+        except (ValueError, discord.NotFound):
+            await interaction.response.send_message(f'`User with ID {user_id} not found.`', ephemeral=True, delete_after=5)
+        except discord.Forbidden:
+            await interaction.response.send_message("`You do not have permission to ban members.`", ephemeral=True, delete_after=5)
+
+    #kick command
+    @app_commands.command(
+        name='kick',
+        description='Kick a member',
+        extras={'defer': 'ephemeral'}
+    )
+    @app_commands.default_permissions(kick_members=True, ban_members=True)
+    @app_commands.checks.has_permissions(kick_members=True, ban_members=True)
+    async def kick(self, interaction: Interaction, member: discord.Member, reason: str = None):
+        if interaction.user.top_role.position > member.top_role.position:
+            await member.kick(reason=reason)
+            await interaction.response.send_message(f'`{member} has been kicked.`')
+            self.mod_mail_store.log_action(interaction.guild.id, 'kick', member.id, interaction.user.id, reason)
+            print(f'{timestamp()} | {member} has been kicked by {interaction.user} in {interaction.guild} for {reason}')
+        else:
+            await interaction.response.send_message("`You do not have permission to kick this member.`", ephemeral=True, delete_after=5)
+
+    #member info
+    @app_commands.command(
+        name='member',
+        description='Get member info'
+    )
+    @app_commands.default_permissions(kick_members=True, ban_members=True)
+    @app_commands.checks.has_permissions(kick_members=True, ban_members=True)
+    async def member(self, interaction: Interaction, member: discord.Member):
+        if interaction.user.top_role.position > member.top_role.position:
+            await interaction.response.send_message(
+                f'`Name: {member.name}\nID: {member.id}\nCreated at: {member.created_at}\nJoined at: {member.joined_at}\nAvatar:`{member.avatar}', ephemeral=True)
+        else:
+            await interaction.response.send_message("`You do not have permission to view information about this member.`", ephemeral=True, delete_after=5)
+
+    #unban command
+    @app_commands.command(
+        name='unban',
+        description='Unban a user by ID',
+        extras={'defer': 'ephemeral'}
+    )
+    @app_commands.default_permissions(kick_members=True, ban_members=True)
+    @app_commands.checks.has_permissions(kick_members=True, ban_members=True)
+    async def unban(self, interaction: Interaction, user_id: str, reason: str = None):
+        try:
+            banned_user = self.describe_user(user_id)
+            await interaction.guild.unban(discord.Object(int(user_id)), reason=reason)
+            await interaction.response.send_message(f'`{banned_user} (ID: {user_id}) has been unbanned.`')
+            self.mod_mail_store.log_action(interaction.guild.id, 'unban', int(user_id), interaction.user.id, reason)
+            print(f'{timestamp()} | {banned_user} (ID: {user_id}) has been unbanned by {interaction.user} in {interaction.guild} for {reason}')
+        except (ValueError, discord.NotFound):
+            await interaction.response.send_message(f'`User with ID {user_id} not found or not banned.`', ephemeral=True, delete_after=5)
+        except discord.Forbidden:
+            await interaction.response.send_message("`You do not have permission to unban members.`", ephemeral=True, delete_after=5)
+
+    #bulk moderation
+    #deferred privately so input errors stay private, the progress message replaces the placeholder in public
+    async def bulk_moderate(self, interaction, verb, user_ids, file, action):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        text = user_ids or ''
+        if file:
+            if file.size > 1024 * 1024:
+                await interaction.followup.send('`The ID file must be under 1 MB.`', ephemeral=True)
+                return
+            text += '\n' + (await file.read()).decode('utf-8', 'ignore')
+        ids = parse_ids(text)
+        if not ids:
+            await interaction.followup.send('`No user IDs found.`', ephemeral=True)
+            return
+        if len(ids) > BULK_MAX_IDS:
+            await interaction.followup.send(f'`Too many IDs ({len(ids)}), the limit is {BULK_MAX_IDS}.`', ephemeral=True)
+            return
+        await self.run_bulk_action(interaction, verb, ids, action)
+
+    async def run_bulk_action(self, interaction, verb, ids, action):
+        message = await interaction.response.send_message(f'`{verb}: 0/{len(ids)}`')
+
+        async def progress(result):
+            await message.edit(content=result.progress(verb))
+
+        result = await run_bulk(ids, action, concurrency=BULK_CONCURRENCY, progress=progress)
+        await message.edit(content=result.summary(verb))
+        print(f'{timestamp()} | bulk {verb} of {len(ids)} users by {interaction.user} in {interaction.guild}: {result.counts()}')
+
+    @app_commands.command(name='bulk_ban', description='ban a list of user IDs')
+    @app_commands.default_permissions(ban_members=True)
+    @app_commands.checks.has_permissions(ban_members=True)
+    async def bulk_ban(self, interaction: Interaction, user_ids: str = None, file: discord.Attachment = None, reason: str = None):
+        async def action(user_id):
+            await check_outranks(interaction, user_id)
+            await interaction.guild.ban(discord.Object(user_id), reason=reason)
+            self.mod_mail_store.log_action(interaction.guild.id, 'ban', user_id, interaction.user.id, reason, 'bulk')
+        await self.bulk_moderate(interaction, 'Bulk ban', user_ids, file, action)
+
+    @app_commands.command(name='bulk_unban', description='unban a list of user IDs')
+    @app_commands.default_permissions(ban_members=True)
+    @app_commands.checks.has_permissions(ban_members=True)
+    async def bulk_unban(self, interaction: Interaction, user_ids: str = None, file: discord.Attachment = None, reason: str = None):
+        async def action(user_id):
+            await interaction.guild.unban(discord.Object(user_id), reason=reason)
+            self.mod_mail_store.log_action(interaction.guild.id, 'unban', user_id, interaction.user.id, reason, 'bulk')
+        await self.bulk_moderate(interaction, 'Bulk unban', user_ids, file, action)
+
+    @app_commands.command(name='bulk_kick', description='kick a list of user IDs')
+    @app_commands.default_permissions(kick_members=True)
+    @app_commands.checks.has_permissions(kick_members=True)
+    async def bulk_kick(self, interaction: Interaction, user_ids: str = None, file: discord.Attachment = None, reason: str = None):
+        async def action(user_id):
+            await check_outranks(interaction, user_id)
+            await interaction.guild.kick(discord.Object(user_id), reason=reason)
+            self.mod_mail_store.log_action(interaction.guild.id, 'kick', user_id, interaction.user.id, reason, 'bulk')
+        await self.bulk_moderate(interaction, 'Bulk kick', user_ids, file, action)
+
+    #raid lockdown, the join counting itself runs in on_member_join
+    @commands.Cog.listener()
+    async def on_ready(self):
+        #a lockdown outlives a restart, the suspects queued before it do not
+        for guild in self.bot.guilds:
+            mod_mail_settings = await self.mod_mail_store.guild(guild.id)
+            reason = mod_mail_settings.get('raid_lockdown')
+            if reason and not self.raid_guard.locked(guild.id):
+                self.raid_guard.lock(guild.id, reason)
+
+    @commands.Cog.listener()
+    async def on_raid_detected(self, guild):
+        state = self.raid_guard.status(guild.id)
+        if state is not None and state.locked_at is not None:
+            await self.lockdown(guild, state.reason)
+
+    async def lockdown(self, guild, reason, moderator=None):
+        mod_mail_settings = await self.mod_mail_store.guild(guild.id)
+        mod_mail_settings.set('raid_lockdown', reason)
+        self.mod_mail_store.log_action(guild.id, 'raid_lockdown', moderator_id=moderator.id if moderator else None, reason=reason)
+        print(f'{timestamp()} | raid lockdown in {guild}: {reason}')
+        verification = 'Verification is unchanged.'
+        previous = guild.verification_level
+        if previous < RAID_VERIFICATION:
+            try:
+                await guild.edit(verification_level=RAID_VERIFICATION, reason=f'Raid lockdown: {reason}')
+                mod_mail_settings.set('raid_verification', previous.value)
+                verification = f'Verification raised to {RAID_VERIFICATION.name}.'
+            except discord.HTTPException as e:
+                verification = f'Could not raise verification: {e.text or e.status}.'
+        mod_mail_channel = guild.get_channel(mod_mail_settings.get('mod_mail_channel_id') or 0)
+        if not mod_mail_channel:
+            return
+        embed = discord.Embed(
+            title='RAID LOCKDOWN',
+            description=f'{reason}.\n{verification} New tickets are paused and new joins are queued.\n'
+                        'Use `/raid ban` or `/raid kick` to remove the queued joins, `/raid end` to lift the lockdown.',
+            color=discord.Color(EMBEDCOLOR)
+        )
+        role_id = mod_mail_settings.get('role_handler')
+        try:
+            await mod_mail_channel.send(content=f'<@&{role_id}>' if role_id else None, embed=embed)
+        except discord.HTTPException as e:
+            print(f'{timestamp()} | could not announce the raid lockdown in {guild}: {e}')
+
+    async def end_lockdown(self, guild, moderator):
+        mod_mail_settings = await self.mod_mail_store.guild(guild.id)
+        self.raid_guard.unlock(guild.id)
+        mod_mail_settings.set('raid_lockdown', None)
+        previous = mod_mail_settings.get('raid_verification')
+        if previous is not None:
+            mod_mail_settings.set('raid_verification', None)
+            try:
+                await guild.edit(verification_level=discord.VerificationLevel(previous), reason=f'Raid lockdown lifted by {moderator}')
+            except discord.HTTPException as e:
+                print(f'{timestamp()} | could not restore verification in {guild}: {e}')
+        self.mod_mail_store.log_action(guild.id, 'raid_end', moderator_id=moderator.id)
+        print(f'{timestamp()} | raid lockdown in {guild} lifted by {moderator}')
+
+    #one request per 200 users instead of one per user
+    async def raid_ban(self, interaction, ids):
+        reason = f'Raid lockdown, banned by {interaction.user}'
+        message = await interaction.followup.send(f'`Raid ban: 0/{len(ids)}`', wait=True)
+        banned, failed = [], []
+        for start in range(0, len(ids), RAID_BAN_CHUNK):
+            chunk = ids[start:start + RAID_BAN_CHUNK]
+            try:
+                result = await interaction.guild.bulk_ban([discord.Object(user_id) for user_id in chunk], reason=reason)
+                banned += [user.id for user in result.banned]
+                failed += [user.id for user in result.failed]
+            except discord.HTTPException:
+                failed += chunk
+            await message.edit(content=f'`Raid ban: {len(banned) + len(failed)}/{len(ids)}`')
+        for user_id in banned:
+            self.mod_mail_store.log_action(interaction.guild.id, 'ban', user_id, interaction.user.id, reason, 'raid')
+        await message.edit(content=f'`Raid ban finished: {len(banned)} banned, {len(failed)} failed`')
+        print(f'{timestamp()} | raid ban of {len(ids)} users by {interaction.user} in {interaction.guild}: {len(banned)} banned, {len(failed)} failed')
+
+    @app_commands.command(name='raid', description='join flood lockdown: status, start, kick or ban the queued joins, end')
+    @app_commands.guild_only()
+    @app_commands.default_permissions(ban_members=True)
+    @app_commands.checks.has_permissions(ban_members=True)
+    @app_commands.choices(action=[app_commands.Choice(name=action, value=action) for action in RAID_ACTIONS])
+    async def raid(self, interaction: Interaction, action: str = 'status'):
+        guild = interaction.guild
+        state = self.raid_guard.status(guild.id)
+        locked = self.raid_guard.locked(guild.id)
+        if action == 'status':
+            if locked:
+                await interaction.response.send_message(
+                    f'`Lockdown` <t:{int(state.locked_at)}:R> `{state.reason}, {len(state.suspects)} new accounts queued.`', ephemeral=True)
+            else:
+                await interaction.response.send_message('`No lockdown.`', ephemeral=True)
+        elif action == 'start':
+            if locked:
+                await interaction.response.send_message('`The server is already in lockdown.`', ephemeral=True)
+                return
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            reason = f'started by {interaction.user}'
+            self.raid_guard.lock(guild.id, reason)
+            await self.lockdown(guild, reason, interaction.user)
+            await interaction.followup.send('`Lockdown started.`', ephemeral=True)
+        elif not locked:
+            await interaction.response.send_message('`No lockdown, use /raid start first.`', ephemeral=True)
+        elif action == 'end':
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            await self.end_lockdown(guild, interaction.user)
+            await interaction.followup.send('`Lockdown lifted.`', ephemeral=True)
+        else:
+            await interaction.response.defer(thinking=True)
+            ids, skipped = [], {}
+            for user_id, created_at in self.raid_guard.take_suspects(guild.id).items():
+                if outranks_cached(interaction, user_id):
+                    skipped[user_id] = created_at
+                else:
+                    ids.append(user_id)
+            self.raid_guard.requeue(guild.id, skipped)
+            if not ids:
+                await interaction.followup.send(f'`No joins are queued{f", {len(skipped)} you cannot moderate stay queued" if skipped else ""}.`')
+            elif action == 'ban':
+                await self.raid_ban(interaction, ids)
+            else:
+                async def kick(user_id):
+                    await guild.kick(discord.Object(user_id), reason=f'Raid lockdown, kicked by {interaction.user}')
+                    self.mod_mail_store.log_action(guild.id, 'kick', user_id, interaction.user.id, 'raid lockdown', 'raid')
+                await self.run_bulk_action(interaction, 'Raid kick', ids, kick)
+
+    @app_commands.command(
+        name='set_raid_threshold',
+        description='lock the server down when this many members, or this many new accounts, join within the window'
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_raid_threshold(
+        self,
+        interaction: Interaction,
+        joins: app_commands.Range[int, 0, 100000],
+        young_joins: app_commands.Range[int, 0, 100000] = None,
+        seconds: app_commands.Range[float, 1, 3600] = None,
+        account_days: app_commands.Range[float, 0, 365] = None
+    ):
+        mod_mail_settings = await self.mod_mail_store.guild(interaction.guild.id)
+        mod_mail_settings.set('raid_joins', joins)
+        for key, value in (('raid_young_joins', young_joins), ('raid_window', seconds), ('raid_account_days', account_days)):
+            if value is not None:
+                mod_mail_settings.set(key, value)
+        config = self.raid_guard.config_for(interaction.guild.id)
+        if config:
+            young = f' or {config.young_joins} accounts younger than {config.account_days:g} days' if config.young_joins else ''
+            await interaction.response.send_message(
+                f'Lockdown after {config.joins} joins{young} within {config.window:g} seconds', ephemeral=True)
+        else:
+            await interaction.response.send_message('Raid detection is off', ephemeral=True)
+
+    @app_commands.command(name='modlog', description='moderation history, newest first')
+    @app_commands.guild_only()
+    @app_commands.default_permissions(kick_members=True)
+    @app_commands.checks.has_permissions(kick_members=True)
+    @app_commands.choices(action=[app_commands.Choice(name=action, value=action) for action in MOD_ACTIONS])
+    async def modlog(
+        self,
+        interaction: Interaction,
+        user: discord.User = None,
+        moderator: discord.User = None,
+        action: str = None,
+        days: app_commands.Range[int, 1, 3650] = None,
+        cursor: int = None
+    ):
+        filters = {
+            'target_id': user.id if user else None,
+            'moderator_id': moderator.id if moderator else None,
+            'action': action,
+            'since': time.time() - days * 86400 if days else None,
+        }
+        embed, next_cursor = await modlog_page(self.mod_mail_store, interaction.guild, filters, cursor)
+        view = ModLogView(interaction.user.id, filters, next_cursor) if next_cursor else discord.utils.MISSING
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(Moderation(bot))
@@ -0,0 +1,130 @@
+import time
+
+import discord
+from discord.ext import commands
+from discord import Interaction, app_commands
+
+from cogs import EXTENSIONS
+from cogs.common import is_bot_owner
+from command_sync import sync_if_changed
+
+
+class Owner(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    #force a global command sync
+    @commands.command()
+    @commands.check(is_bot_owner)
+    async def sync(self, ctx):
+        started = time.perf_counter()
+        await sync_if_changed(self.bot.tree, self.bot.mod_mail_store, force=True)
+        await ctx.send(f'`Commands synced in {time.perf_counter() - started:.2f}s`', delete_after=10)
+
+    #hot reload
+    async def sync_changed(self):
+        if not self.bot.cluster.primary:
+            return 'commands are synced by the primary cluster'
+        started = time.perf_counter()
+        synced = await sync_if_changed(self.bot.tree, self.bot.mod_mail_store)
+        if not synced:
+            return 'commands unchanged'
+        return f'synced {", ".join(synced)} in {(time.perf_counter() - started) * 1000:.0f}ms'
+
+    async def update_extensions(self, ctx, verb, update, names):
+        unknown = [name for name in names if name not in EXTENSIONS]
+        if unknown:
+            await ctx.send(f'`Unknown extension: {", ".join(unknown)}. Available: {", ".join(EXTENSIONS)}`')
+            return
+        done = []
+        for name in names:
+            started = time.perf_counter()
+            try:
+                await update(f'cogs.{name}')
+            except commands.ExtensionError as e:
+                #reload_extension rolls back, so the old code keeps running
+                done.append(f'{name} failed: {e.__cause__ or e}')
+                continue
+            done.append(f'{name} {(time.perf_counter() - started) * 1000:.0f}ms')
+        sync_status = await self.sync_changed()
+        print(f'{verb} {", ".join(done)} | {sync_status}')
+        await ctx.send(f'`{verb} {", ".join(done)} | {sync_status}`')
+
+    @commands.command()
+    @commands.check(is_bot_owner)
+    async def reload(self, ctx, *names):
+        loaded = [name.split('.')[-1] for name in self.bot.extensions]
+        await self.update_extensions(ctx, 'Reloaded', self.bot.reload_extension, names or loaded)
+
+    @commands.command()
+    @commands.check(is_bot_owner)
+    async def load(self, ctx, *names):
+        await self.update_extensions(ctx, 'Loaded', self.bot.load_extension, names)
+
+    @commands.command()
+    @commands.check(is_bot_owner)
+    async def unload(self, ctx, *names):
+        if 'owner' in names:
+            await ctx.send('`The owner extension holds the reload commands, reload it instead.`')
+            return
+        await self.update_extensions(ctx, 'Unloaded', self.bot.unload_extension, names)
+
+    #update presence
+    @commands.command()
+    @commands.check(is_bot_owner)
+    async def presence(self, ctx):
+        self.bot.presence_counter.recount(self.bot.guilds)
+        await self.bot.presence_counter.push(force=True)
+        await ctx.send('`Presence updated!`', delete_after=10)
+
+    @commands.command()
+    @commands.check(is_bot_owner)
+    async def relay(self, ctx):
+        stats = self.bot.owner_relay.stats()
+        await ctx.send(f"`DMs relayed: {stats['relayed']}, dropped: {stats['dropped']}, messages sent: {stats['sent']}, queued: {stats['queued']}`", delete_after=10)
+
+    @commands.command()
+    @commands.check(is_bot_owner)
+    async def usercache(self, ctx):
+        stats = self.bot.user_resolver.stats()
+        await ctx.send(f"`User lookups - local hits: {stats['local_hits']}, cache hits: {stats['cache_hits']}, merged: {stats['merged']}, fetched: {stats['misses']}, cached: {stats['cached']}`", delete_after=10)
+
+    #owner command
+    @app_commands.command(
+        name='send_dm',
+        description='Send a DM to a user',
+        extras={'defer': 'ephemeral'}
+    )
+    async def send_dm(self, interaction: Interaction, user_id: str, message: str):
+        if interaction.user.id != self.bot.owner_id:
+            await interaction.response.send_message("`You do not have permission to use this command.`", ephemeral=True, delete_after=5)
+            return
+        try:
+            target_user = await self.bot.user_resolver.resolve(int(user_id))
+            await target_user.send(message)
+            await interaction.response.send_message(f"Message sent to {target_user}: {message}", ephemeral=True)
+        except (ValueError, discord.errors.NotFound):
+            await interaction.response.send_message("`User not found.`", ephemeral=True, delete_after=5)
+
+    @app_commands.command(
+        name='stats',
+        description='Command latency, REST and event loop stats'
+    )
+    async def stats(self, interaction: Interaction):
+        if interaction.user.id != self.bot.owner_id:
+            await interaction.response.send_message("`You do not have permission to use this command.`", ephemeral=True, delete_after=5)
+            return
+        metrics = self.bot.metrics
+        #first response times are always kept, the rest only with metrics on
+        summary = f'{self.bot.response_timings.summary()}\n{self.bot.ticket_timings.summary()}'
+        if interaction.guild:
+            summary += f'\n  waiting for a slot here: {self.bot.ticket_queue.waiting(interaction.guild.id)}'
+        if metrics.enabled:
+            summary = f'{metrics.summary()}\n{summary}'
+        else:
+            summary += '\nSet METRICS_ENABLED=1 for handler, REST and event loop stats.'
+        await interaction.response.send_message(f'```{summary[:1990]}```', ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(Owner(bot))
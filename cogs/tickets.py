@@ -0,0 +1,384 @@
+import os
+import time
+import datetime
+
+import discord
+from discord.ext import commands
+from discord import Interaction, app_commands
+
+from cogs.common import (
+    EMBEDCOLOR, channel_autocomplete, date, has_admin_permissions, not_found_message, resolve_channel, timestamp
+)
+from intents import get_or_fetch_member
+from tickets import QueueFull
+from transcripts import archive_ticket
+
+TRANSCRIPT_DIR = os.getenv('TRANSCRIPT_DIR', 'transcripts')
+TRANSCRIPT_HTML = os.getenv('TRANSCRIPT_HTML', '0') == '1'
+TICKET_EMBED_IMAGE = 'https://media.discordapp.net/attachments/1201196057942560918/1201196300931174541/embedticket.gif?ex=65c8f03b&is=65b67b3b&hm=60daaf02842967bb5e7c93e543b4d7759c6af5a4f805d675de6c303168f1d316&='
+
+
+def ticket_overwrites(guild, user, role=None):
+    overwrites = {
+        guild.default_role: discord.PermissionOverwrite(read_messages=False, send_messages=False),
+        guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True),
+        user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
+    }
+    if role:
+        overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+    return overwrites
+
+def format_hours(seconds):
+    hours = seconds / 3600
+    return f'{hours:.0f} hours' if hours >= 1 else f'{max(seconds / 60, 1):.0f} minutes'
+
+
+class Tickets(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.mod_mail_store = bot.mod_mail_store
+        self.ticket_registry = bot.ticket_registry
+        self.idle_reaper = bot.idle_reaper
+
+    #a reload after ready has nothing to rebuild, but a late first load still tracks what is open
+    async def cog_load(self):
+        if self.bot.is_ready():
+            for guild in self.bot.guilds:
+                await self.ticket_registry.load_guild(guild)
+                self.track_idle_tickets(guild)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild in self.bot.guilds:
+            await self.ticket_registry.load_guild(guild)
+            self.track_idle_tickets(guild)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.guild and message.author != self.bot.user:
+            self.idle_reaper.touch(message.guild.id, message.channel.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.idle_reaper.forget(channel.guild.id, channel.id)
+        await self.ticket_registry.remove(channel.guild.id, channel.id)
+
+    #ticket system
+    async def reject_duplicate_ticket(self, interaction):
+        existing_ticket = self.ticket_registry.by_user(interaction.guild.id, interaction.user.id)
+        if existing_ticket:
+            await interaction.followup.send(f'`You already have an open ticket: {existing_ticket.channel_name}`', ephemeral=True)
+        else:
+            await interaction.followup.send('`Your ticket is already being opened.`', ephemeral=True)
+
+    async def open_ticket(self, interaction, reason, channel_name, admin=False, urgent=False):
+        if self.bot.raid_guard.locked(interaction.guild.id):
+            await interaction.response.send_message('`New tickets are paused while the server is in lockdown, please try again later.`', ephemeral=True)
+            return
+        ticket_timings = self.bot.ticket_timings
+        timings = {}
+        #the response layer deferred before this ran (extras below), its time to first response is the defer stage
+        ticket_timings.record('defer', interaction.response.first_response, timings)
+        mod_mail_settings = await self.mod_mail_store.guild(interaction.guild.id)
+        mod_mail_channel = interaction.guild.get_channel(mod_mail_settings.get('mod_mail_channel_id'))
+        handler_role_id = None if admin else mod_mail_settings.get('role_handler')
+        if not mod_mail_channel:
+            await interaction.followup.send("`Mod mail channel not found. Please contact an admin/mod`", ephemeral=True)
+            return
+        await self.ticket_registry.load_guild(interaction.guild)
+        if not self.ticket_registry.reserve(interaction.guild.id, interaction.user.id):
+            await self.reject_duplicate_ticket(interaction)
+            return
+
+        async def notify(position):
+            await interaction.followup.send(f'`Ticket queue is busy, you are #{position} in line.`', ephemeral=True)
+
+        queued_at = time.perf_counter()
+        try:
+            async with self.bot.ticket_queue.slot(interaction.guild.id, notify):
+                ticket_timings.record('queue', time.perf_counter() - queued_at, timings)
+                role = interaction.guild.get_role(int(handler_role_id)) if handler_role_id else None
+                with ticket_timings.stage('create', timings):
+                    new_channel = await interaction.guild.create_text_channel(
+                        name=channel_name,
+                        category=mod_mail_channel.category,
+                        overwrites=ticket_overwrites(interaction.guild, interaction.user, role)
+                    )
+                ticket = await self.ticket_registry.open(interaction.guild.id, interaction.user.id, new_channel, urgent, admin)
+                self.idle_reaper.track(interaction.guild.id, new_channel.id)
+                self.mod_mail_store.log_action(interaction.guild.id, 'ticket_open', interaction.user.id, interaction.user.id, reason, new_channel.name)
+        except QueueFull:
+            await interaction.followup.send('`Too many tickets are being opened right now, please try again shortly.`', ephemeral=True)
+            return
+        finally:
+            #the open ticket is indexed by user from here on
+            self.ticket_registry.release(interaction.guild.id, interaction.user.id)
+
+        with ticket_timings.stage('reply', timings):
+            await interaction.followup.send(f'done! {new_channel.mention}', ephemeral=True)
+        #only urgent tickets ping the whole staff role, the rest wait in /queue for someone to /claim them
+        position = self.ticket_registry.queue_for(ticket).position(ticket)
+        embed = discord.Embed(
+            title=f'Welcome to your {"urgent " if urgent else ""}ticket channel, {interaction.user.name}',
+            description=f'**Please wait for {f"<@&{handler_role_id}>" if handler_role_id else "admin"} to assist you, you are #{position} in the queue.\n If you no longer need help, use {self.bot.command_prefix}close.**',
+            color=discord.Color(EMBEDCOLOR),
+            timestamp=datetime.datetime.now()
+        )
+        embed.add_field(name='Reason:', value=f'**{reason}**', inline=True)
+        embed.set_image(url=TICKET_EMBED_IMAGE)
+        mention = f'{interaction.user.mention} <@&{handler_role_id}>' if handler_role_id and urgent else interaction.user.mention
+        with ticket_timings.stage('welcome', timings):
+            await new_channel.send(mention, embed=embed)
+        print(f'{timestamp()} | {new_channel.name} opened | ' + ' '.join(f'{stage} {seconds * 1000:.0f}ms' for stage, seconds in timings.items()))
+
+    @app_commands.command(
+        name='ticket',
+        description='Create a ticket channel',
+        extras={'defer': 'ephemeral'}
+    )
+    @app_commands.describe(urgent='ping the staff role and jump ahead of non-urgent tickets')
+    async def ticket(self, interaction, reason: str, urgent: bool = False):
+        await self.open_ticket(interaction, reason, f'{interaction.user.name}-{date()}-ticket', urgent=urgent)
+
+    @app_commands.command(
+        name='ticket_admin',
+        description='Create a ticket channel',
+        extras={'defer': 'ephemeral'}
+    )
+    async def ticket_admin(self, interaction, reason: str):
+        await self.open_ticket(interaction, reason, f'admin-{interaction.user.name}-ticket', admin=True)
+
+    #staff queue
+    async def is_staff(self, interaction):
+        if interaction.permissions.administrator or interaction.permissions.manage_channels:
+            return True
+        mod_mail_settings = await self.mod_mail_store.guild(interaction.guild.id)
+        role_id = mod_mail_settings.get('role_handler')
+        return bool(role_id) and interaction.user.get_role(int(role_id)) is not None
+
+    @app_commands.command(name='claim', description='take the next ticket in the queue', extras={'defer': 'ephemeral'})
+    @app_commands.guild_only()
+    async def claim(self, interaction: Interaction):
+        if not await self.is_staff(interaction):
+            await interaction.response.send_message('`Only staff can claim tickets.`', ephemeral=True, delete_after=5)
+            return
+        await self.ticket_registry.load_guild(interaction.guild)
+        admin = interaction.permissions.administrator
+        ticket = await self.ticket_registry.claim_next(interaction.guild.id, interaction.user.id, admin)
+        if ticket is None:
+            await interaction.response.send_message('`No tickets are waiting.`', ephemeral=True)
+            return
+        channel = interaction.guild.get_channel(ticket.channel_id)
+        await interaction.response.send_message(
+            f'You claimed {channel.mention if channel else ticket.channel_name}, waiting since <t:{int(ticket.opened_at)}:R>'
+            f'{" (urgent)" if ticket.urgent else ""}. {self.ticket_registry.waiting_count(interaction.guild.id, admin)} still waiting.',
+            ephemeral=True
+        )
+        self.mod_mail_store.log_action(interaction.guild.id, 'ticket_claim', ticket.user_id, interaction.user.id, detail=ticket.channel_name)
+        if channel:
+            #staff without the handler role (admin tickets, manage channels) still need to see it
+            await channel.set_permissions(interaction.user, read_messages=True, send_messages=True)
+            await channel.send(f'<@{ticket.user_id}> your ticket was claimed by {interaction.user.mention}.')
+
+    @app_commands.command(name='queue', description='tickets waiting for staff, urgent first')
+    @app_commands.guild_only()
+    async def queue(self, interaction: Interaction):
+        if not await self.is_staff(interaction):
+            await interaction.response.send_message('`Only staff can view the ticket queue.`', ephemeral=True, delete_after=5)
+            return
+        await self.ticket_registry.load_guild(interaction.guild)
+        admin = interaction.permissions.administrator
+        tickets = self.ticket_registry.waiting_tickets(interaction.guild.id, admin=admin)
+        lines = [
+            f'{position}. {"**ADMIN** " if ticket.admin else ""}{"**URGENT** " if ticket.urgent else ""}<#{ticket.channel_id}> <@{ticket.user_id}> waiting since <t:{int(ticket.opened_at)}:R>'
+            for position, ticket in enumerate(tickets, 1)
+        ]
+        embed = discord.Embed(
+            title='TICKET QUEUE',
+            description='\n'.join(lines) or 'No tickets are waiting.',
+            color=discord.Color(EMBEDCOLOR)
+        )
+        waiting = self.ticket_registry.waiting_count(interaction.guild.id, admin)
+        if waiting > len(tickets):
+            embed.set_footer(text=f'{waiting - len(tickets)} more waiting')
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    #close ticket
+    async def close_ticket(self, channel, ticket, closed_by=None):
+        owner = await get_or_fetch_member(channel.guild, ticket.user_id)
+        if owner:
+            await channel.set_permissions(owner, overwrite=None)
+        await self.ticket_registry.close(ticket)
+        self.idle_reaper.forget(channel.guild.id, channel.id)
+        self.mod_mail_store.log_action(channel.guild.id, 'ticket_close', ticket.user_id, closed_by.id if closed_by else None, detail=ticket.channel_name)
+        if closed_by:
+            await channel.send(f'Ticket channel closed by {closed_by.mention}. Staff will no longer receive messages in this channel.')
+        else:
+            await channel.send('Ticket channel closed for inactivity. Staff will no longer receive messages in this channel.')
+        mod_mail_settings = await self.mod_mail_store.guild(channel.guild.id)
+        archive_category = channel.guild.get_channel(mod_mail_settings.get('archive_category_id'))
+
+        async def archived(path, count, channel_name):
+            await self.ticket_registry.rename(ticket, channel_name)
+            print(f'{timestamp()} | {ticket.channel_name} archived, {count} messages written to {path}')
+
+        self.bot.archive_jobs.submit(archive_ticket(channel, TRANSCRIPT_DIR, archive_category, TRANSCRIPT_HTML), archived)
+        if owner:
+            user_dm_message = (
+                f'`Your ticket ({ticket.channel_name}) has been closed{"" if closed_by else " for inactivity"}.`\n'
+                f'`If you need assistance again, use /ticket.`'
+            )
+            try:
+                await owner.send(user_dm_message)
+            except discord.Forbidden:
+                pass
+
+    @commands.command()
+    @commands.guild_only()
+    async def close(self, ctx):
+        await self.ticket_registry.load_guild(ctx.guild)
+        ticket = self.ticket_registry.by_channel(ctx.guild.id, ctx.channel.id)
+        if not ticket:
+            return
+        if ticket.is_open:
+            await self.close_ticket(ctx.channel, ticket, ctx.author)
+        else:
+            await ctx.send(f'Ticket channel closed by {ctx.author.mention}. Staff will no longer receive messages in this channel.')
+            await ctx.channel.delete()
+
+    #idle tickets, dispatched by the reaper in master.py
+    @commands.Cog.listener()
+    async def on_ticket_idle_warning(self, guild_id, channel_id):
+        channel = self.bot.get_channel(channel_id)
+        deadline = self.idle_reaper.deadline(guild_id, channel_id)
+        if channel is None or deadline is None:
+            return
+        ticket = self.ticket_registry.by_channel(guild_id, channel_id)
+        mention = f'<@{ticket.user_id}> ' if ticket else ''
+        await channel.send(f'{mention}`This ticket has had no activity for a while and will be closed in {format_hours(deadline - time.time())} unless someone replies.`')
+
+    @commands.Cog.listener()
+    async def on_ticket_idle(self, guild_id, channel_id):
+        channel = self.bot.get_channel(channel_id)
+        ticket = self.ticket_registry.by_channel(guild_id, channel_id)
+        if channel is None or ticket is None or not ticket.is_open:
+            return
+        await self.close_ticket(channel, ticket)
+        print(f'{timestamp()} | {ticket.channel_name} closed for inactivity')
+
+    #last activity comes from the cached last message id, so no history is fetched
+    def track_idle_tickets(self, guild):
+        for ticket in self.ticket_registry.open_tickets(guild.id):
+            if (guild.id, ticket.channel_id) in self.idle_reaper:
+                continue
+            channel = guild.get_channel(ticket.channel_id)
+            last_activity = discord.utils.snowflake_time(channel.last_message_id).timestamp() if channel and channel.last_message_id else ticket.opened_at
+            self.idle_reaper.track(guild.id, ticket.channel_id, last_activity)
+
+    #delete ticket
+    @commands.command()
+    @commands.guild_only()
+    @commands.check(has_admin_permissions)
+    async def delete(self, ctx):
+        await self.ticket_registry.load_guild(ctx.guild)
+        if self.ticket_registry.by_channel(ctx.guild.id, ctx.channel.id):
+            await ctx.channel.delete()
+
+    #reset mod mail
+    @commands.command()
+    @commands.check(has_admin_permissions)
+    async def reset(self, ctx):
+        await self.ticket_registry.reset(ctx.guild.id)
+
+        await ctx.send("`Mod mail settings have been reset.`", delete_after=10)
+
+    #mod mail setup
+    @app_commands.command(
+        name='set_mod_mail',
+        description='mod_mail_setup',
+        extras={'defer': 'ephemeral'}
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_mod_mail(self, interaction: Interaction, channel_name: str, category_reference: str, role_handler: str):
+        role_id = role_handler.strip('<@&>')
+        try:
+            target_category = resolve_channel(self.bot.channel_index, interaction.guild, category_reference, discord.CategoryChannel)
+
+            if target_category:
+                new_channel = await interaction.guild.create_text_channel(
+                    name=channel_name,
+                    category=target_category
+                )
+                await new_channel.set_permissions(interaction.guild.default_role, read_messages=True, send_messages=False)
+                mod_mail_settings = await self.mod_mail_store.guild(interaction.guild.id)
+                mod_mail_settings.set('mod_mail_channel_id', new_channel.id)
+                mod_mail_settings.set('role_handler', role_id)
+
+                await interaction.response.send_message(
+                    f'Mod mail category set to {target_category.name}\n'
+                    f'Mod mail channel created: {new_channel.name}\n'
+                    f'Role handler set to <@&{role_id}>',
+                    ephemeral=True
+                )
+                embed = discord.Embed(
+                title=f"Welcome to {new_channel.name} channel",
+                description="use /ticket [reason] to create a ticket in any text channel",
+                color=discord.Color(EMBEDCOLOR),
+                timestamp=datetime.datetime.now()
+                )
+                embed.set_image(
+                    url='https://media.discordapp.net/attachments/1201196057942560918/1201196301765836952/embedticketset.gif?ex=65c8f03b&is=65b67b3b&hm=bf0abdf78648ec1f3c1fecd729d0684ee43091c04d95471bb8eae5b79f3486eb&='
+                )
+                await new_channel.send(embed=embed)
+
+            else:
+                await interaction.response.send_message(
+                    not_found_message(self.bot.channel_index, 'Category', interaction.guild, category_reference, discord.CategoryChannel)
+                )
+        except discord.errors.Forbidden:
+            await interaction.response.send_message(
+                '`You do not have permission to create channels in that category.`', ephemeral=True, delete_after=5
+            )
+        except Exception as e:
+            await interaction.response.send_message(f'`An error occurred: {e}`', ephemeral=True, delete_after=5)
+
+    set_mod_mail.autocomplete('category_reference')(channel_autocomplete(discord.CategoryChannel))
+
+    @app_commands.command(
+        name='set_archive',
+        description='category closed tickets are moved to'
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_archive(self, interaction: Interaction, category_reference: str):
+        target_category = resolve_channel(self.bot.channel_index, interaction.guild, category_reference, discord.CategoryChannel)
+        if not target_category:
+            await interaction.response.send_message(
+                not_found_message(self.bot.channel_index, 'Category', interaction.guild, category_reference, discord.CategoryChannel), ephemeral=True
+            )
+            return
+        mod_mail_settings = await self.mod_mail_store.guild(interaction.guild.id)
+        mod_mail_settings.set('archive_category_id', target_category.id)
+        await interaction.response.send_message(f'Closed tickets will be archived to {target_category.name}', ephemeral=True)
+
+    set_archive.autocomplete('category_reference')(channel_autocomplete(discord.CategoryChannel))
+
+    @app_commands.command(
+        name='set_idle_timeout',
+        description='close tickets after this many hours without messages (0 turns it off)'
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_idle_timeout(self, interaction: Interaction, hours: app_commands.Range[float, 0, 720]):
+        mod_mail_settings = await self.mod_mail_store.guild(interaction.guild.id)
+        mod_mail_settings.set('idle_timeout_hours', hours)
+        self.idle_reaper.reschedule_guild(interaction.guild.id)
+        if hours:
+            await interaction.response.send_message(f'Tickets will be closed after {format_hours(hours * 3600)} without activity', ephemeral=True)
+        else:
+            await interaction.response.send_message('Idle tickets will no longer be closed', ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(Tickets(bot))
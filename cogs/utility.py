@@ -0,0 +1,155 @@
+import datetime
+
+import discord
+from discord.ext import commands
+from discord import Interaction, app_commands
+
+from cogs.common import (
+    EMBEDCOLOR, channel_autocomplete, not_found_message, resolve_channel
+)
+
+
+class Utility(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(
+            name='help',
+            description='list of commands'
+    )
+    async def help(self, interaction: Interaction):
+        prefix = self.bot.command_prefix
+        embed = discord.Embed(
+            title='COMMANDS',
+            description=None,
+            color=discord.Color(EMBEDCOLOR),
+            timestamp=datetime.datetime.now()
+        )
+        embed.add_field(name="SLASH", value=
+"""
+- /about - About the bot
+- /ticket [reason][urgent]
+- /claim - take the next waiting ticket (STAFF)
+- /queue - tickets waiting for staff (STAFF)
+- /announce [channel id][message]
+- /avatar [member]
+- /ban [member]
+- /banid [userID]
+- /unban [userID]
+- /kick [member]
+- /bulk_ban /bulk_kick /bulk_unban [IDs or file]
+- /modlog [user][moderator][action][days] - moderation history
+- /raid [status|start|kick|ban|end] - join flood lockdown
+- /set_mod_mail [set channel name][category name dont include '#'] (ADMIN ONLY)
+- /set_archive [category] - where closed tickets go (ADMIN ONLY)
+- /set_idle_timeout [hours] - auto close idle tickets, 0 for never (ADMIN ONLY)
+- /set_raid_threshold [joins][young joins][seconds][account days] (ADMIN ONLY)\n
+""", inline=True)
+
+        embed.add_field(name="PREFIX", value=
+f"""
+- {prefix}hello
+- {prefix}purge [amount] [--user][--contains][--attachments][--before][--after]
+- {prefix}purge cancel
+- {prefix}reset - Reset mod mail settings (ADMIN ONLY)
+""", inline=True)
+        embed.set_image(
+            url='https://media.discordapp.net/attachments/1201196057942560918/1201196300419477656/embed2.gif?ex=65c8f03b&is=65b67b3b&hm=28926823b7c611af5cadad8a2c1a31de4e05d2811ca7746e7f4bbfab62857976&='
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(
+            name='about',
+            description='About me'
+    )
+    async def about(self, interaction: Interaction):
+        embed = discord.Embed(
+            title='Ticket system',
+            description=f'Use slash "/" commands to interact with me!\n or use /help',
+            color=discord.Color(EMBEDCOLOR),
+            timestamp=datetime.datetime.now()
+        )
+        embed.add_field(name='Invite me:', value='[click me :>](https://discord.com/api/oauth2/authorize?client_id=1182663601593520139&permissions=8&scope=applications.commands%20bot "invite link")', inline=True)
+        embed.add_field(name='Source Code:', value='[repository](https://github.com/Samshh/DiscordBot "github repo")', inline=True)
+        embed.add_field(name='Creator:', value='[meiple](https://samshh.netlify.app/ "samshh")', inline=True)
+        embed.set_author(name='About me')
+        embed.set_thumbnail(
+            url='https://images-ext-2.discordapp.net/external/qdBFIQ1Da8L7m9iGDzq8D9cCdqR-hy_eS20yLfRSl6E/%3Fsize%3D1024/https/cdn.discordapp.com/avatars/784897622728638495/a_1723d8537d0a57255ccbdcba04c92bbb.gif'
+            )
+        embed.set_image(
+            url='https://media.discordapp.net/attachments/1201196057942560918/1201196302659227658/embed.gif?ex=65c8f03b&is=65b67b3b&hm=e54f1819f59174cfc6dddf8e3fd5a3634747f11c5cd44945fe95f3c00b0dd6f8&='
+        )
+        embed.set_footer(text='I love Frieren')
+        await interaction.response.send_message(embed=embed)
+
+    @commands.command()
+    async def hello(self, ctx):
+        await ctx.send(mention_author=True, content=f'`Hello` {ctx.author.mention}!')
+
+    # youtube link
+    @app_commands.command(name='chillin', description='ghibli vibes')
+    async def meiplechill(self, interaction: Interaction):
+        await interaction.response.send_message('https://youtu.be/7c4rlVOFFDk')
+
+    # latency check command
+    @app_commands.command(
+        name='ping',
+        description='how slow is meiple?'
+    )
+    async def ping(self, interaction: Interaction):
+        shard_note = ''
+        shard_list = ''
+        if self.bot.cluster.sharded:
+            shard_id = interaction.guild.shard_id if interaction.guild else 0
+            shard = self.bot.get_shard(shard_id)
+            bot_latency = round((shard.latency if shard else self.bot.latency) * 1000)
+            shard_note = f' (shard {shard_id})'
+            shard_list = '\n```' + '\n'.join(f'shard {number}: {round(latency * 1000)}ms' for number, latency in self.bot.latencies) + '```'
+        else:
+            bot_latency = round(self.bot.latency * 1000)
+        if bot_latency > 100:
+            await interaction.response.send_message(f'`Kinda slow af: {bot_latency}ms{shard_note}`{shard_list}')
+        elif bot_latency < 50:
+            await interaction.response.send_message(f'`Fast af: {bot_latency}ms{shard_note}`{shard_list}')
+        else:
+            await interaction.response.send_message(f'`Not bad: {bot_latency}ms{shard_note}`{shard_list}')
+
+    #avatar command
+    @app_commands.command(
+        name='avatar',
+        description='get member avatar'
+    )
+    async def avatar(self, interaction: Interaction, member: discord.Member):
+        await interaction.response.send_message(f'{member.avatar}', ephemeral=True)
+
+    #announce command
+    @app_commands.command(
+        name='announce',
+        description='announce on a channel',
+        extras={'defer': 'ephemeral'}
+    )
+    @app_commands.default_permissions(kick_members=True, ban_members=True)
+    @app_commands.checks.has_permissions(kick_members=True, ban_members=True)
+    async def announce(self, interaction: Interaction, channel_reference: str, message: str):
+      channel_index = self.bot.channel_index
+      try:
+        target_channel = resolve_channel(channel_index, interaction.guild, channel_reference, discord.abc.Messageable)
+        if target_channel:
+          await target_channel.send(f'{message}')
+          await interaction.response.send_message(
+              f'`Announcement sent in {target_channel.name}` {message}')
+        else:
+          await interaction.response.send_message(
+              not_found_message(channel_index, 'Channel', interaction.guild, channel_reference, discord.abc.Messageable),
+              ephemeral=True, delete_after=5)
+      except discord.errors.Forbidden:
+        await interaction.response.send_message(
+            "`You do not have permission to send messages in that channel.`", ephemeral=True, delete_after=5)
+      except Exception as e:
+        await interaction.response.send_message(f'`An error occurred: {e}`', ephemeral=True, delete_after=5)
+
+    announce.autocomplete('channel_reference')(channel_autocomplete(discord.abc.Messageable))
+
+
+async def setup(bot):
+    await bot.add_cog(Utility(bot))
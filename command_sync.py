@@ -0,0 +1,43 @@
+import hashlib
+import json
+
+from storage import GLOBAL_SETTINGS
+
+# the global command sync is slow and rate limited, so only the slash commands that
+# differ from the ones synced last time are sent. each command is fingerprinted on
+# its own: a reload that touches one command upserts just that one, and a full
+# overwrite is only needed when commands were removed or many changed at once.
+
+UPSERT_LIMIT = 5
+
+
+def command_fingerprints(tree):
+    fingerprints = {}
+    for command in tree.get_commands():
+        payload = command.to_dict(tree)
+        fingerprints[payload['name']] = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return fingerprints
+
+
+#returns the names of the commands that were sent, empty if nothing changed
+async def sync_if_changed(tree, store, force=False):
+    settings = await store.guild(GLOBAL_SETTINGS)
+    fingerprints = command_fingerprints(tree)
+    synced = settings.get('command_fingerprints')
+    if force or synced is None:
+        changed = sorted(fingerprints)
+        await tree.sync()
+    else:
+        changed = sorted(name for name, fingerprint in fingerprints.items() if synced.get(name) != fingerprint)
+        removed = [name for name in synced if name not in fingerprints]
+        if not changed and not removed:
+            return []
+        if removed or len(changed) > UPSERT_LIMIT:
+            await tree.sync()
+        else:
+            commands = {command.name: command for command in tree.get_commands()}
+            for name in changed:
+                await tree.client.http.upsert_global_command(tree.client.application_id, commands[name].to_dict(tree))
+        changed += removed
+    settings.set('command_fingerprints', fingerprints)
+    return changed
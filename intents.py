@@ -0,0 +1,45 @@
+import discord
+
+# gateway options per INTENTS_MODE.
+# full: every intent, every member cached and chunked at startup (the old behaviour).
+# minimal: only what the commands and events use. members are not chunked at startup;
+# slash commands get their members from the interaction payload and everything else
+# fetches on demand. guilds up to chunk_limit members are still chunked lazily.
+
+
+def minimal_intents():
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.members = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.message_content = True
+    return intents
+
+
+def bot_options(mode, chunk_limit=0):
+    if mode == 'full':
+        return {
+            'intents': discord.Intents.all(),
+        }
+    if mode == 'minimal':
+        return {
+            'intents': minimal_intents(),
+            'member_cache_flags': discord.MemberCacheFlags(voice=False, joined=True) if chunk_limit else discord.MemberCacheFlags.none(),
+            'chunk_guilds_at_startup': False,
+        }
+    raise ValueError(f'Unknown INTENTS_MODE {mode!r}, expected full or minimal')
+
+
+def should_chunk(guild, chunk_limit):
+    return bool(chunk_limit) and not guild.chunked and (guild.member_count or 0) <= chunk_limit
+
+
+async def get_or_fetch_member(guild, user_id):
+    member = guild.get_member(user_id)
+    if member is not None:
+        return member
+    try:
+        return await guild.fetch_member(user_id)
+    except discord.NotFound:
+        return None
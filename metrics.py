@@ -0,0 +1,207 @@
+import asyncio
+import bisect
+import re
+import time
+
+import aiohttp
+from aiohttp import web
+from discord import app_commands
+
+# opt-in instrumentation: latency histograms for app commands, prefix commands and
+# event handlers, REST call / 429 counts and latency per route, and event loop lag.
+# served as prometheus text on a local port and summarised by /stats. with
+# METRICS_ENABLED off none of the hooks are installed and the wrappers fall straight
+# through to discord.py.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SNOWFLAKE = re.compile(r'/\d{15,20}(?=/|$)')
+TOKEN = re.compile(r'/(webhooks|interactions)/:id/[^/]+')
+
+
+def route_name(method, url):
+    path = url.path
+    if '/api/v' in path:
+        path = '/' + path.split('/api/v', 1)[1].split('/', 1)[-1]
+    path = TOKEN.sub(r'/\1/:id/:token', SNOWFLAKE.sub('/:id', path))
+    return f'{method} {path}'
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    #upper bound of the bucket holding the q-th observation
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def lines(self, metric, labels):
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            yield f'{metric}_bucket{{{labels},le="{bound}"}} {seen}'
+        yield f'{metric}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{metric}_sum{{{labels}}} {self.total:.6f}'
+        yield f'{metric}_count{{{labels}}} {self.count}'
+
+
+class RouteStats:
+    __slots__ = ('latency', 'rate_limited', 'errors')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.rate_limited = 0
+        self.errors = 0
+
+
+class Metrics:
+    def __init__(self, enabled=False, lag_interval=0.5):
+        self.enabled = enabled
+        self.lag_interval = lag_interval
+        self.handlers = {}
+        self.failures = {}
+        self.routes = {}
+        self.loop_lag = Histogram()
+        self.max_lag = 0.0
+        self._lag_task = None
+        self._runner = None
+
+    def observe(self, kind, name, seconds, failed=False):
+        key = (kind, name)
+        histogram = self.handlers.get(key)
+        if histogram is None:
+            histogram = self.handlers[key] = Histogram()
+        histogram.observe(seconds)
+        if failed:
+            self.failures[key] = self.failures.get(key, 0) + 1
+
+    def route(self, name):
+        stats = self.routes.get(name)
+        if stats is None:
+            stats = self.routes[name] = RouteStats()
+        return stats
+
+    #http
+    def trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.started = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            stats = self.route(route_name(params.method, params.url))
+            stats.latency.observe(time.perf_counter() - context.started)
+            if params.response.status == 429:
+                stats.rate_limited += 1
+            elif params.response.status >= 500:
+                stats.errors += 1
+
+        async def on_request_exception(session, context, params):
+            stats = self.route(route_name(params.method, params.url))
+            stats.latency.observe(time.perf_counter() - context.started)
+            stats.errors += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        return trace
+
+    #event loop lag: how late a sleep wakes up
+    async def _sample_lag(self):
+        while True:
+            expected = time.perf_counter() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            lag = max(time.perf_counter() - expected, 0.0)
+            self.loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    async def start(self, host='127.0.0.1', port=0):
+        if not self.enabled:
+            return
+        self._lag_task = asyncio.create_task(self._sample_lag())
+        if port:
+            app = web.Application()
+            app.router.add_get('/metrics', self._serve)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, host, port).start()
+            print(f'Metrics served on http://{host}:{port}/metrics')
+
+    async def stop(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _serve(self, request):
+        return web.Response(text=self.render(), content_type='text/plain')
+
+    #output
+    def render(self):
+        lines = ['# TYPE bot_handler_seconds histogram']
+        for (kind, name), histogram in sorted(self.handlers.items()):
+            lines.extend(histogram.lines('bot_handler_seconds', f'kind="{kind}",name="{name}"'))
+        lines.append('# TYPE bot_handler_failures_total counter')
+        for (kind, name), count in sorted(self.failures.items()):
+            lines.append(f'bot_handler_failures_total{{kind="{kind}",name="{name}"}} {count}')
+        lines.append('# TYPE bot_http_seconds histogram')
+        for route, stats in sorted(self.routes.items()):
+            lines.extend(stats.latency.lines('bot_http_seconds', f'route="{route}"'))
+        lines.append('# TYPE bot_http_rate_limited_total counter')
+        for route, stats in sorted(self.routes.items()):
+            lines.append(f'bot_http_rate_limited_total{{route="{route}"}} {stats.rate_limited}')
+        lines.append('# TYPE bot_http_errors_total counter')
+        for route, stats in sorted(self.routes.items()):
+            lines.append(f'bot_http_errors_total{{route="{route}"}} {stats.errors}')
+        lines.append('# TYPE bot_loop_lag_seconds histogram')
+        lines.extend(self.loop_lag.lines('bot_loop_lag_seconds', 'loop="main"'))
+        lines.append(f'bot_loop_lag_max_seconds {self.max_lag:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, limit=5):
+        slowest = sorted(self.handlers.items(), key=lambda item: item[1].quantile(0.99), reverse=True)[:limit]
+        busiest = sorted(self.routes.items(), key=lambda item: item[1].latency.count, reverse=True)[:limit]
+        lines = ['Slowest handlers (p99 / calls):']
+        lines += [f'  {kind} {name}: {histogram.quantile(0.99) * 1000:.0f}ms / {histogram.count}' for (kind, name), histogram in slowest]
+        lines.append('Busiest routes (calls / 429s / p99):')
+        lines += [
+            f'  {route}: {stats.latency.count} / {stats.rate_limited} / {stats.latency.quantile(0.99) * 1000:.0f}ms'
+            for route, stats in busiest
+        ]
+        lines.append(f'Loop lag p99 {self.loop_lag.quantile(0.99) * 1000:.0f}ms, max {self.max_lag * 1000:.0f}ms')
+        return '\n'.join(lines)
+
+
+#times every slash command, including failures and autocomplete
+class InstrumentedTree(app_commands.CommandTree):
+    metrics = None
+
+    async def _call(self, interaction):
+        if not self.metrics or not self.metrics.enabled:
+            return await super()._call(interaction)
+        started = time.perf_counter()
+        failed = True
+        try:
+            await super()._call(interaction)
+            failed = interaction.command_failed
+        finally:
+            command = interaction.command
+            name = command.qualified_name if command else 'unknown'
+            kind = 'autocomplete' if interaction.type.name == 'autocomplete' else 'app'
+            self.metrics.observe(kind, name, time.perf_counter() - started, failed)
@@ -0,0 +1,53 @@
+import asyncio
+
+# running member total across guilds. join/leave/guild events adjust it in O(1)
+# and changes are coalesced so at most one presence update is pushed per window.
+
+
+class PresenceCounter:
+    def __init__(self, push, window=30.0):
+        self._push = push
+        self.window = window
+        self.total = 0
+        self._counts = {}
+        self._pushed = None
+        self._pending = None
+
+    def set_guild(self, guild_id, count):
+        self.total += (count or 0) - self._counts.get(guild_id, 0)
+        self._counts[guild_id] = count or 0
+        self.schedule()
+
+    def remove_guild(self, guild_id):
+        self.total -= self._counts.pop(guild_id, 0)
+        self.schedule()
+
+    def adjust(self, guild_id, delta):
+        self._counts[guild_id] = self._counts.get(guild_id, 0) + delta
+        self.total += delta
+        self.schedule()
+
+    #drift correction: rebuild from the member counts discord reports
+    def recount(self, guilds):
+        before = self.total
+        self._counts = {guild.id: guild.member_count or 0 for guild in guilds}
+        self.total = sum(self._counts.values())
+        return self.total - before
+
+    def schedule(self):
+        if self._pending is None:
+            self._pending = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._pending = None
+        await self.push()
+
+    async def push(self, force=False):
+        if not force and self.total == self._pushed:
+            return False
+        self._pushed = self.total
+        await self._push(self.total)
+        return True
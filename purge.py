@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+import re
+
+import discord
+
+# streaming purge: channel history is read lazily page by page, matching messages
+# younger than 14 days are bulk deleted in chunks of 100 and older ones are deleted
+# one at a time. at most one chunk is held in memory however much is purged.
+
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14, minutes=-5)
+BULK_DELETE_SIZE = 100
+
+
+class PurgeFilter:
+    def __init__(self, author_id=None, pattern=None, attachments=None):
+        self.author_id = author_id
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.attachments = attachments
+
+    def matches(self, message):
+        if message.pinned:
+            return False
+        if self.author_id is not None and message.author.id != self.author_id:
+            return False
+        if self.attachments is not None and bool(message.attachments) != self.attachments:
+            return False
+        if self.pattern is not None and not self.pattern.search(message.content):
+            return False
+        return True
+
+
+class PurgeJob:
+    def __init__(self, channel, limit, filter=None, before=None, after=None, scan_limit=None, old_delete_delay=1.0):
+        self.channel = channel
+        self.limit = limit
+        self.filter = filter or PurgeFilter()
+        self.before = before
+        self.after = after
+        self.scan_limit = scan_limit
+        self.old_delete_delay = old_delete_delay
+        self.scanned = 0
+        self.deleted = 0
+        self.cancelled = False
+        self._batch = []
+
+    def cancel(self):
+        self.cancelled = True
+
+    def status(self):
+        state = 'cancelled' if self.cancelled else 'purging'
+        return f'`{state}: scanned {self.scanned}, deleted {self.deleted}/{self.limit}`'
+
+    async def run(self, progress=None, interval=3.0):
+        reporter = asyncio.create_task(self._report(progress, interval)) if progress else None
+        try:
+            cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+            history = self.channel.history(limit=self.scan_limit, before=self.before, after=self.after)
+            async for message in history:
+                if self.cancelled:
+                    break
+                self.scanned += 1
+                if not self.filter.matches(message):
+                    continue
+                if message.created_at > cutoff:
+                    self._batch.append(message)
+                    if len(self._batch) == BULK_DELETE_SIZE:
+                        await self._flush()
+                else:
+                    await self._flush()
+                    try:
+                        await message.delete()
+                        self.deleted += 1
+                    except discord.NotFound:
+                        pass
+                    await asyncio.sleep(self.old_delete_delay)
+                if self.deleted + len(self._batch) >= self.limit:
+                    break
+            await self._flush()
+        finally:
+            if reporter:
+                reporter.cancel()
+        return self.deleted
+
+    async def _flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        try:
+            await self.channel.delete_messages(batch)
+        except discord.NotFound:
+            #one of them was already gone, fall back to single deletes
+            for message in batch:
+                try:
+                    await message.delete()
+                except discord.NotFound:
+                    continue
+        self.deleted += len(batch)
+
+    async def _report(self, progress, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await progress(self)
+            except discord.HTTPException:
+                pass
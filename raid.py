@@ -0,0 +1,159 @@
+import time
+from collections import deque
+
+# join flood detection. every guild gets two sliding-window counters, all joins and
+# joins from accounts younger than account_days, each a ring of fixed-width buckets
+# so a join and a threshold check are O(1) no matter how fast members arrive. when
+# either count crosses its limit the guild goes into lockdown: accounts younger than
+# account_days that joined inside the window or join after that are queued as suspects
+# for one bulk kick or ban, and the bot raises verification and pauses /ticket until
+# staff end it. older accounts are left alone, they are usually regulars rejoining.
+
+BUCKETS = 30
+SUSPECT_LIMIT = 10000
+
+
+class SlidingWindow:
+    def __init__(self, window, buckets=BUCKETS):
+        self.window = window
+        self.width = window / buckets
+        self.counts = [0] * buckets
+        self.total = 0
+        self.slot = 0
+
+    #clear the buckets time has moved past, at most one pass over the ring
+    def _advance(self, now):
+        slot = int(now / self.width)
+        if slot <= self.slot:
+            return
+        if slot - self.slot >= len(self.counts):
+            self.counts = [0] * len(self.counts)
+            self.total = 0
+        else:
+            for stale in range(self.slot + 1, slot + 1):
+                index = stale % len(self.counts)
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        self.slot = slot
+
+    def add(self, now):
+        self._advance(now)
+        self.counts[self.slot % len(self.counts)] += 1
+        self.total += 1
+        return self.total
+
+    def count(self, now):
+        self._advance(now)
+        return self.total
+
+
+class RaidConfig:
+    __slots__ = ('joins', 'young_joins', 'window', 'account_days')
+
+    def __init__(self, joins, young_joins, window, account_days):
+        self.joins = joins
+        self.young_joins = young_joins
+        self.window = window
+        self.account_days = account_days
+
+
+class GuildRaidState:
+    def __init__(self, window):
+        self.joins = SlidingWindow(window)
+        self.young = SlidingWindow(window)
+        self.recent = deque(maxlen=SUSPECT_LIMIT)
+        self.locked_at = None
+        self.reason = None
+        #user id -> account creation time
+        self.suspects = {}
+
+
+class RaidGuard:
+    #config_for(guild_id) -> RaidConfig or None when detection is off
+    def __init__(self, config_for, suspect_limit=SUSPECT_LIMIT):
+        self.config_for = config_for
+        self.suspect_limit = suspect_limit
+        self._guilds = {}
+
+    def _state(self, guild_id, window):
+        state = self._guilds.get(guild_id)
+        if state is None:
+            state = self._guilds[guild_id] = GuildRaidState(window)
+        elif state.joins.window != window:
+            state.joins = SlidingWindow(window)
+            state.young = SlidingWindow(window)
+        return state
+
+    def locked(self, guild_id):
+        state = self._guilds.get(guild_id)
+        return state is not None and state.locked_at is not None
+
+    def status(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    def _suspect(self, state, user_id, created_at):
+        if len(state.suspects) < self.suspect_limit:
+            state.suspects[user_id] = created_at
+
+    #without a config (detection off, locked by hand) every join counts as young
+    @staticmethod
+    def _young(config, created_at, now):
+        return config is None or now - created_at < config.account_days * 86400
+
+    #returns True for the join that starts a lockdown
+    def observe(self, guild_id, user_id, created_at, now=None):
+        now = now or time.time()
+        state = self._guilds.get(guild_id)
+        config = self.config_for(guild_id)
+        if state is not None and state.locked_at is not None:
+            if self._young(config, created_at, now):
+                self._suspect(state, user_id, created_at)
+            return False
+        if config is None:
+            return False
+        state = self._state(guild_id, config.window)
+        young = self._young(config, created_at, now)
+        joins = state.joins.add(now)
+        young_joins = state.young.add(now) if young else state.young.count(now)
+        #join order is time order, so expired joins are always at the front
+        state.recent.append((now, user_id, created_at))
+        while state.recent[0][0] <= now - config.window:
+            state.recent.popleft()
+        if joins >= config.joins:
+            self.lock(guild_id, f'{joins} joins in {config.window:.0f}s', now)
+        elif config.young_joins and young_joins >= config.young_joins:
+            self.lock(guild_id, f'{young_joins} accounts younger than {config.account_days:g} days joined in {config.window:.0f}s', now)
+        else:
+            return False
+        return True
+
+    def lock(self, guild_id, reason, now=None):
+        config = self.config_for(guild_id)
+        state = self._state(guild_id, config.window if config else 60)
+        if state.locked_at is not None:
+            return
+        state.locked_at = now or time.time()
+        state.reason = reason
+        for _, user_id, created_at in state.recent:
+            if self._young(config, created_at, state.locked_at):
+                self._suspect(state, user_id, created_at)
+        state.recent.clear()
+
+    def take_suspects(self, guild_id):
+        state = self._guilds.get(guild_id)
+        if state is None:
+            return []
+        suspects = dict(state.suspects)
+        state.suspects.clear()
+        return suspects
+
+    #suspects staff could not act on stay queued while the lockdown lasts
+    def requeue(self, guild_id, suspects):
+        state = self._guilds.get(guild_id)
+        if state is None or state.locked_at is None:
+            return
+        for user_id, created_at in suspects.items():
+            self._suspect(state, user_id, created_at)
+
+    def unlock(self, guild_id):
+        self._guilds.pop(guild_id, None)
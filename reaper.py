@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import time
+
+# closes tickets nobody has written in for a while. on_message only stamps the
+# ticket's last activity, which is O(1) and never touches the heap. the min-heap
+# holds one live entry per ticket for when it next needs looking at (its warning,
+# then its close), and a single task sleeps until the earliest one. an entry that
+# comes due is checked against the latest activity and pushed back if the ticket
+# has been active since, so nothing is scanned on a timer.
+
+
+class IdleReaper:
+    #timeout_for(guild_id) -> seconds or None, warn/close(guild_id, channel_id) are awaited
+    def __init__(self, timeout_for, warn, close, warn_before=3600):
+        self._timeout_for = timeout_for
+        self._warn = warn
+        self._close = close
+        self.warn_before = warn_before
+        self._activity = {}
+        self._warned = {}
+        self._scheduled = {}
+        self._guilds = {}
+        self._heap = []
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def __len__(self):
+        return len(self._activity)
+
+    def __contains__(self, key):
+        return key in self._activity
+
+    def track(self, guild_id, channel_id, last_activity=None):
+        key = (guild_id, channel_id)
+        self._activity[key] = last_activity or time.time()
+        self._warned.pop(key, None)
+        self._guilds.setdefault(guild_id, set()).add(channel_id)
+        self._schedule(key)
+
+    def touch(self, guild_id, channel_id):
+        key = (guild_id, channel_id)
+        if key in self._activity:
+            self._activity[key] = time.time()
+            self._warned.pop(key, None)
+
+    def forget(self, guild_id, channel_id):
+        key = (guild_id, channel_id)
+        self._activity.pop(key, None)
+        self._warned.pop(key, None)
+        self._scheduled.pop(key, None)
+        channels = self._guilds.get(guild_id)
+        if channels:
+            channels.discard(channel_id)
+
+    #after a guild's timeout changes
+    def reschedule_guild(self, guild_id):
+        for channel_id in self._guilds.get(guild_id, ()):
+            self._schedule((guild_id, channel_id))
+
+    def deadline(self, guild_id, channel_id):
+        key = (guild_id, channel_id)
+        return self._close_at(key, self._timeout_for(guild_id)) if key in self._activity else None
+
+    def _close_at(self, key, timeout):
+        if not timeout:
+            return None
+        close_at = self._activity[key] + timeout
+        warned_at = self._warned.get(key)
+        #a late warning still gets its full notice period
+        if warned_at is not None:
+            close_at = max(close_at, warned_at + min(self.warn_before, timeout))
+        return close_at
+
+    def _next_check(self, key):
+        timeout = self._timeout_for(key[0])
+        if not timeout:
+            return None
+        if self.warn_before and key not in self._warned:
+            return self._activity[key] + max(timeout - self.warn_before, 0)
+        return self._close_at(key, timeout)
+
+    def _schedule(self, key):
+        due = self._next_check(key)
+        if due is None:
+            self._scheduled.pop(key, None)
+            return
+        self._scheduled[key] = due
+        heapq.heappush(self._heap, (due, key))
+        if self._wakeup and self._heap[0][1] == key:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            due, key = self._heap[0]
+            delay = due - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            #superseded by a later _schedule, or forgotten
+            if self._scheduled.get(key) != due:
+                continue
+            del self._scheduled[key]
+            await self._check(key)
+
+    async def _check(self, key):
+        due = self._next_check(key)
+        if due is None:
+            return
+        if due > time.time():
+            self._schedule(key)
+            return
+        guild_id, channel_id = key
+        try:
+            if self.warn_before and key not in self._warned:
+                self._warned[key] = time.time()
+                self._schedule(key)
+                await self._warn(guild_id, channel_id)
+            else:
+                self.forget(guild_id, channel_id)
+                await self._close(guild_id, channel_id)
+        except Exception as e:
+            print(f'Error reaping idle ticket {channel_id}: {e}')
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import aiohttp
+import discord
+
+# forwards DMs sent to the bot to its owner. the owner's DM channel is resolved once,
+# the first DM is relayed on its own and anything that arrives while a send is in
+# flight is flushed as a digest split to discord's message limit. past `cap` DMs per
+# window only every `sample_every`-th one is kept (0 drops them all). a digest that
+# fails on a transient error (discord 5xx, connection trouble, shutdown) goes back to
+# the front of the queue for the next flush, past BACKLOG_LIMIT waiting entries the
+# oldest are dropped instead. any other failure, like the owner closing their DMs,
+# drops the digest rather than retrying it forever.
+
+MESSAGE_LIMIT = 2000
+BACKLOG_LIMIT = 500
+TRANSIENT_ERRORS = (aiohttp.ClientError, OSError, asyncio.TimeoutError, asyncio.CancelledError)
+
+
+def is_transient(error):
+    if isinstance(error, discord.DiscordServerError):
+        return True
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class OwnerRelay:
+    def __init__(self, client, owner_id, interval=2.0, cap=60, window=60.0, sample_every=0):
+        self.client = client
+        self.owner_id = owner_id
+        self.interval = interval
+        self.cap = cap
+        self.window = window
+        self.sample_every = sample_every
+        self.relayed = 0
+        self.dropped = 0
+        self.sent = 0
+        self._channel = None
+        self._queue = []
+        self._wakeup = asyncio.Event()
+        self._window_start = 0.0
+        self._window_count = 0
+        self._window_dropped = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._queue:
+            await self._flush()
+
+    def stats(self):
+        return {'relayed': self.relayed, 'dropped': self.dropped, 'sent': self.sent, 'queued': len(self._queue)}
+
+    async def owner_channel(self):
+        if self._channel is None:
+            owner = self.client.get_user(self.owner_id) or await self.client.fetch_user(self.owner_id)
+            self._channel = owner.dm_channel or await owner.create_dm()
+        return self._channel
+
+    def submit(self, message):
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            if self._window_dropped:
+                self._queue.append(f'`{self._window_dropped} DMs dropped in the last {self.window:.0f}s`')
+            self._window_start = now
+            self._window_count = 0
+            self._window_dropped = 0
+        self._window_count += 1
+        over = self._window_count - self.cap
+        if over > 0 and (not self.sample_every or over % self.sample_every):
+            self.dropped += 1
+            self._window_dropped += 1
+            return False
+        self._queue.append(format_dm(message))
+        self.relayed += 1
+        self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            try:
+                await self._flush()
+            except Exception as e:
+                print(f'Error relaying DMs to owner: {e}')
+            await asyncio.sleep(self.interval)
+
+    async def _flush(self):
+        self._wakeup.clear()
+        entries, self._queue = self._queue, []
+        if not entries:
+            return
+        header = f'DM digest ({len(entries)} messages)' if len(entries) > 1 else None
+        done = 0
+        try:
+            channel = await self.owner_channel()
+            for chunk, count in pack(entries, header):
+                await channel.send(chunk)
+                self.sent += 1
+                done += count
+        except BaseException as e:
+            if is_transient(e):
+                self._requeue(entries[done:])
+            else:
+                #the owner's DM channel may be gone, look it up again next time
+                self._channel = None
+                self._drop(len(entries) - done)
+            raise
+
+    #unsent entries go ahead of anything submitted during the failed flush
+    def _requeue(self, entries):
+        self._queue = entries + self._queue
+        over = len(self._queue) - BACKLOG_LIMIT
+        if over > 0:
+            del self._queue[:over]
+            self._drop(over)
+        self._wakeup.set()
+
+    def _drop(self, count):
+        self.relayed -= count
+        self.dropped += count
+
+
+def format_dm(message):
+    content = f"Received DM from {message.author} (ID: {message.author.id})\nContent: {message.content}"
+    if message.attachments:
+        content += "\nAttachments:"
+        for attachment in message.attachments:
+            content += f"\n{attachment.url}"
+    return content
+
+
+#greedy packing of entries into messages under the limit, yields (message, entries in it).
+#oversized entries are truncated, the first one to fit behind the header
+def pack(entries, header=None, limit=MESSAGE_LIMIT):
+    chunk, count = header or '', 0
+    for entry in entries:
+        room = limit - len(chunk) - 2 if header and chunk == header else limit
+        if len(entry) > room:
+            entry = entry[:room - 3] + '...'
+        if count and len(chunk) + 2 + len(entry) > limit:
+            yield chunk, count
+            chunk, count = '', 0
+        chunk = f'{chunk}\n\n{entry}' if chunk else entry
+        count += 1
+    if count:
+        yield chunk, count
@@ -0,0 +1,185 @@
+import asyncio
+import time
+
+import discord
+from discord import app_commands
+
+from metrics import Histogram
+
+# every slash command gets exactly one reply. the tree swaps each interaction's
+# response for a GuardedResponse: once the interaction has been answered or deferred,
+# send_message goes out as a follow-up instead of raising and a second defer does
+# nothing. commands that always talk to discord before answering are marked with
+# extras={'defer': 'ephemeral'} and deferred before the handler runs, anything else
+# still silent after DEFER_AFTER seconds is deferred by a timer so it stays inside
+# discord's 3 second window. defers are private ('public' only for commands whose
+# every answer is public), since the first follow-up inherits the defer's visibility;
+# a public answer replaces the private placeholder instead. a handler that finishes
+# or fails without answering gets a short error reply. time to first response is
+# kept per command.
+
+DEADLINE = 3.0
+DEFER_AFTER = 2.0
+FAILED_MESSAGE = '`Something went wrong, please try again.`'
+FORBIDDEN_MESSAGE = '`You do not have permission to use this command.`'
+
+
+#interaction.followup, counting what the handler sends through it directly
+class GuardedFollowup:
+    def __init__(self, webhook, response):
+        self._webhook = webhook
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._webhook, name)
+
+    async def send(self, *args, **kwargs):
+        message = await self._webhook.send(*args, **kwargs)
+        self._response.followups += 1
+        return message
+
+
+class GuardedResponse(discord.InteractionResponse):
+    def __init__(self, parent, name):
+        super().__init__(parent)
+        self.name = name
+        self.started = time.perf_counter()
+        self.first_response = None
+        self.auto_deferred = False
+        self.deferred_ephemeral = False
+        self.followups = 0
+        self._late_defer = False
+        self._lock = asyncio.Lock()
+
+    def _responded(self):
+        if self.first_response is None:
+            self.first_response = time.perf_counter() - self.started
+
+    async def defer(self, **kwargs):
+        async with self._lock:
+            if self.is_done():
+                return None
+            result = await super().defer(**kwargs)
+            self.deferred_ephemeral = kwargs.get('ephemeral', False)
+            self._responded()
+            return result
+
+    async def send_message(self, content=None, *, delete_after=None, **kwargs):
+        async with self._lock:
+            if not self.is_done():
+                result = await super().send_message(content, delete_after=delete_after, **kwargs)
+                self._responded()
+                return result
+        #already answered or deferred, everything after that is a follow-up
+        if self.deferred_ephemeral and not kwargs.get('ephemeral') and not self.followups:
+            await self._parent.delete_original_response()
+        message = await self._parent.followup.send(discord.utils.MISSING if content is None else content, wait=True, **kwargs)
+        if delete_after is not None:
+            await message.delete(delay=delete_after)
+        return message
+
+    async def send_modal(self, modal):
+        async with self._lock:
+            result = await super().send_modal(modal)
+            self._responded()
+            return result
+
+    #the timer side, runs while the handler is still working
+    async def defer_after(self, delay, ephemeral=True):
+        await asyncio.sleep(delay)
+        self._late_defer = True
+        async with self._lock:
+            if self.is_done():
+                return
+            try:
+                await super().defer(ephemeral=ephemeral, thinking=True)
+            except discord.HTTPException as e:
+                print(f'Could not defer /{self.name}: {e}')
+                return
+            self.deferred_ephemeral = ephemeral
+            self.auto_deferred = True
+            self._responded()
+
+    #the handler returned or failed without a reply, or failed after a defer
+    async def finish(self, error):
+        message = FORBIDDEN_MESSAGE if isinstance(error, app_commands.CheckFailure) else FAILED_MESSAGE
+        try:
+            if not self.is_done():
+                await self.send_message(message, ephemeral=True)
+                return True
+            if error is not None and self.type is discord.InteractionResponseType.deferred_channel_message and not self.followups:
+                await self.send_message(message, ephemeral=True)
+                return True
+        except discord.HTTPException as e:
+            print(f'Could not answer /{self.name}: {e}')
+        return False
+
+
+class ResponseStats:
+    __slots__ = ('latency', 'auto_deferred', 'late', 'fallbacks')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.auto_deferred = 0
+        self.late = 0
+        self.fallbacks = 0
+
+
+class ResponseTimings:
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.commands = {}
+
+    def observe(self, name, response, fallback):
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = ResponseStats()
+        seconds = response.first_response if response.first_response is not None else time.perf_counter() - response.started
+        stats.latency.observe(seconds)
+        stats.auto_deferred += response.auto_deferred
+        stats.fallbacks += fallback
+        if seconds > DEADLINE:
+            stats.late += 1
+            print(f'/{name} answered after {seconds:.2f}s, past the {DEADLINE:.0f}s deadline')
+        if self.metrics and self.metrics.enabled:
+            self.metrics.observe('response', name, seconds, fallback)
+
+    def summary(self, limit=5):
+        slowest = sorted(self.commands.items(), key=lambda item: item[1].latency.quantile(0.99), reverse=True)[:limit]
+        lines = ['First response (p99 / calls / auto deferred / late / fallback):']
+        lines += [
+            f'  /{name}: {stats.latency.quantile(0.99) * 1000:.0f}ms / {stats.latency.count} / {stats.auto_deferred} / {stats.late} / {stats.fallbacks}'
+            for name, stats in slowest
+        ]
+        return '\n'.join(lines)
+
+
+class ResponseTree(app_commands.CommandTree):
+    timings = None
+    defer_after = DEFER_AFTER
+
+    async def _call(self, interaction):
+        if interaction.type is not discord.InteractionType.application_command:
+            return await super()._call(interaction)
+        command = interaction.command
+        response = interaction._cs_response = GuardedResponse(interaction, command.qualified_name if command else 'unknown')
+        interaction._cs_followup = GuardedFollowup(interaction.followup, response)
+        mode = command.extras.get('defer') if command else None
+        if mode:
+            await response.defer(ephemeral=mode == 'ephemeral', thinking=True)
+        watchdog = asyncio.create_task(response.defer_after(self.defer_after, ephemeral=mode != 'public'))
+        try:
+            await super()._call(interaction)
+        finally:
+            #never cut a defer off halfway, discord may already have it
+            if response._late_defer:
+                await watchdog
+            else:
+                watchdog.cancel()
+            fallback = await response.finish(interaction.extras.pop('error', None))
+            if self.timings and command:
+                self.timings.observe(response.name, response, fallback)
+
+    async def on_error(self, interaction, error):
+        interaction.extras['error'] = error
+        await super().on_error(interaction, error)
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# mod mail storage: one sqlite database (WAL mode), rows keyed by guild.
+# reads are loaded lazily per guild and cached, writes are queued and
+# flushed in batches on a single worker thread so the event loop never blocks.
+# the moderation audit log lives in the same database and write queue; it is
+# never cached, queries page through it newest first by id. in cluster mode every
+# process opens the same file and reports its member total to cluster_members.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    guild_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, key)
+);
+CREATE TABLE IF NOT EXISTS tickets (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    channel_name TEXT NOT NULL,
+    opened_at REAL NOT NULL,
+    closed_at REAL,
+    urgent INTEGER NOT NULL DEFAULT 0,
+    claimed_by INTEGER,
+    admin INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, channel_id)
+);
+CREATE TABLE IF NOT EXISTS mod_actions (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    target_id INTEGER,
+    moderator_id INTEGER,
+    reason TEXT,
+    detail TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mod_actions_guild ON mod_actions (guild_id, id);
+CREATE INDEX IF NOT EXISTS mod_actions_target ON mod_actions (guild_id, target_id, id);
+CREATE INDEX IF NOT EXISTS mod_actions_moderator ON mod_actions (guild_id, moderator_id, id);
+CREATE INDEX IF NOT EXISTS mod_actions_action ON mod_actions (guild_id, action, id);
+CREATE INDEX IF NOT EXISTS mod_actions_time ON mod_actions (guild_id, created_at);
+CREATE TABLE IF NOT EXISTS cluster_members (
+    cluster_id INTEGER PRIMARY KEY,
+    members INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+#columns added after their table was first released, for databases created before them,
+#with an optional statement that fills the new column in for existing rows
+MIGRATIONS = (
+    ('tickets', 'urgent', 'INTEGER NOT NULL DEFAULT 0'),
+    ('tickets', 'claimed_by', 'INTEGER'),
+    ('tickets', 'admin', 'INTEGER NOT NULL DEFAULT 0', "UPDATE tickets SET admin = 1 WHERE channel_name LIKE 'admin-%'"),
+)
+
+#settings row for values that are not tied to a guild
+GLOBAL_SETTINGS = 0
+
+TICKET_COLUMNS = ('guild_id', 'channel_id', 'user_id', 'channel_name', 'opened_at', 'closed_at', 'urgent', 'claimed_by', 'admin')
+MOD_ACTION_COLUMNS = ('id', 'guild_id', 'action', 'target_id', 'moderator_id', 'reason', 'detail', 'created_at')
+MOD_ACTIONS = ('ban', 'unban', 'kick', 'purge', 'ticket_open', 'ticket_claim', 'ticket_close', 'raid_lockdown', 'raid_end')
+
+
+class Ticket:
+    __slots__ = TICKET_COLUMNS
+
+    def __init__(self, guild_id, channel_id, user_id, channel_name, opened_at, closed_at=None, urgent=False, claimed_by=None, admin=False):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.channel_name = channel_name
+        self.opened_at = opened_at
+        self.closed_at = closed_at
+        self.urgent = bool(urgent)
+        self.claimed_by = claimed_by
+        self.admin = bool(admin)
+
+    @property
+    def is_open(self):
+        return self.closed_at is None
+
+    def row(self):
+        return tuple(getattr(self, column) for column in TICKET_COLUMNS)
+
+
+class ModAction:
+    __slots__ = MOD_ACTION_COLUMNS
+
+    def __init__(self, id, guild_id, action, target_id, moderator_id, reason, detail, created_at):
+        self.id = id
+        self.guild_id = guild_id
+        self.action = action
+        self.target_id = target_id
+        self.moderator_id = moderator_id
+        self.reason = reason
+        self.detail = detail
+        self.created_at = created_at
+
+
+class GuildSettings:
+    def __init__(self, store, guild_id, settings=None, tickets=None):
+        self._store = store
+        self.guild_id = guild_id
+        self.settings = settings or {}
+        # channel_id -> Ticket, open and closed
+        self.tickets = tickets or {}
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def set(self, key, value):
+        self.settings[key] = value
+        self._store._queue(
+            'INSERT OR REPLACE INTO settings (guild_id, key, value) VALUES (?, ?, ?)',
+            (self.guild_id, key, json.dumps(value))
+        )
+
+    def save_ticket(self, ticket):
+        self.tickets[ticket.channel_id] = ticket
+        self._store._queue(
+            f'INSERT OR REPLACE INTO tickets ({", ".join(TICKET_COLUMNS)}) VALUES ({", ".join("?" * len(TICKET_COLUMNS))})',
+            ticket.row()
+        )
+
+    def open_ticket(self, user_id, channel_id, channel_name, urgent=False, admin=False):
+        ticket = Ticket(self.guild_id, channel_id, user_id, channel_name, time.time(), urgent=urgent, admin=admin)
+        self.save_ticket(ticket)
+        return ticket
+
+    def claim_ticket(self, ticket, staff_id):
+        ticket.claimed_by = staff_id
+        self.save_ticket(ticket)
+
+    def close_ticket(self, ticket):
+        ticket.closed_at = time.time()
+        self.save_ticket(ticket)
+
+    def remove_ticket(self, channel_id):
+        ticket = self.tickets.pop(channel_id, None)
+        if ticket is not None:
+            self._store._queue(
+                'DELETE FROM tickets WHERE guild_id = ? AND channel_id = ?',
+                (self.guild_id, channel_id)
+            )
+        return ticket
+
+    def reset(self):
+        self.settings.clear()
+        self.tickets.clear()
+        self._store._queue('DELETE FROM settings WHERE guild_id = ?', (self.guild_id,))
+        self._store._queue('DELETE FROM tickets WHERE guild_id = ?', (self.guild_id,))
+
+
+class ModMailStore:
+    def __init__(self, path, flush_interval=0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='modmail-store')
+        self._db = None
+        self._guilds = {}
+        self._loading = {}
+        self._pending = []
+        self._wakeup = None
+        self._flusher = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def start(self):
+        await self._run(self._open)
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        await self._run(self._db.close)
+        self._executor.shutdown(wait=True)
+
+    def _open(self):
+        #other cluster processes may hold the write lock for a moment
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(SCHEMA)
+        for table, column, definition, *backfill in MIGRATIONS:
+            if column not in {row[1] for row in db.execute(f'PRAGMA table_info({table})')}:
+                try:
+                    db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                except sqlite3.OperationalError as e:
+                    #another cluster process added it first
+                    if 'duplicate column' not in str(e):
+                        raise
+                    continue
+                for statement in backfill:
+                    db.execute(statement)
+                db.commit()
+        self._db = db
+
+    #lazy per-guild load, concurrent callers share one read
+    async def guild(self, guild_id):
+        cached = self._guilds.get(guild_id)
+        if cached is not None:
+            return cached
+        task = self._loading.get(guild_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(guild_id))
+            self._loading[guild_id] = task
+        return await task
+
+    #the guild's settings if they are already loaded, for callers that cannot await
+    def peek(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    async def _load(self, guild_id):
+        try:
+            settings, tickets = await self._run(self._read_guild, guild_id)
+            guild = GuildSettings(self, guild_id, settings, tickets)
+            self._guilds[guild_id] = guild
+            return guild
+        finally:
+            self._loading.pop(guild_id, None)
+
+    def _read_guild(self, guild_id):
+        settings = {
+            key: json.loads(value)
+            for key, value in self._db.execute('SELECT key, value FROM settings WHERE guild_id = ?', (guild_id,))
+        }
+        tickets = {
+            row[1]: Ticket(*row)
+            for row in self._db.execute(
+                f'SELECT {", ".join(TICKET_COLUMNS)} FROM tickets WHERE guild_id = ?', (guild_id,)
+            )
+        }
+        return settings, tickets
+
+    #audit log
+    def log_action(self, guild_id, action, target_id=None, moderator_id=None, reason=None, detail=None):
+        self._queue(
+            f'INSERT INTO mod_actions ({", ".join(MOD_ACTION_COLUMNS[1:])}) VALUES ({", ".join("?" * (len(MOD_ACTION_COLUMNS) - 1))})',
+            (guild_id, action, target_id, moderator_id, reason, detail, time.time())
+        )
+
+    #newest first, `before` is the id of the last entry of the previous page
+    async def mod_actions(self, guild_id, target_id=None, moderator_id=None, action=None, since=None, before=None, limit=10):
+        await self.flush()
+        return await self._run(self._read_mod_actions, guild_id, target_id, moderator_id, action, since, before, limit)
+
+    def _read_mod_actions(self, guild_id, target_id, moderator_id, action, since, before, limit):
+        where = ['guild_id = ?']
+        params = [guild_id]
+        for column, value in (('target_id', target_id), ('moderator_id', moderator_id)):
+            if value is not None:
+                where.append(f'{column} = ?')
+                params.append(value)
+        #a user filter is far more selective than the action, the unary + keeps sqlite on the user index
+        if action is not None:
+            where.append('+action = ?' if target_id or moderator_id else 'action = ?')
+            params.append(action)
+        #ids grow with time, so a time bound becomes an id bound found on the time index
+        if since is not None:
+            first = self._db.execute(
+                'SELECT id FROM mod_actions WHERE guild_id = ? AND created_at >= ? ORDER BY created_at LIMIT 1', (guild_id, since)
+            ).fetchone()
+            if first is None:
+                return []
+            where.append('id >= ?')
+            params.append(first[0])
+        if before is not None:
+            where.append('id < ?')
+            params.append(before)
+        rows = self._db.execute(
+            f'SELECT {", ".join(MOD_ACTION_COLUMNS)} FROM mod_actions WHERE {" AND ".join(where)} ORDER BY id DESC LIMIT ?',
+            (*params, limit)
+        )
+        return [ModAction(*row) for row in rows]
+
+    #cluster presence
+    def set_cluster_members(self, cluster_id, members):
+        self._queue(
+            'INSERT OR REPLACE INTO cluster_members (cluster_id, members, updated_at) VALUES (?, ?, ?)',
+            (cluster_id, members, time.time())
+        )
+
+    #rows from processes that stopped reporting are left out
+    async def cluster_member_total(self, stale_after=900):
+        await self.flush()
+        return await self._run(self._read_cluster_total, time.time() - stale_after)
+
+    def _read_cluster_total(self, since):
+        return self._db.execute('SELECT COALESCE(SUM(members), 0) FROM cluster_members WHERE updated_at >= ?', (since,)).fetchone()[0]
+
+    #write-behind
+    def _queue(self, sql, params):
+        self._pending.append((sql, params))
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                print(f'Error flushing mod mail settings: {e}')
+
+    async def flush(self):
+        self._wakeup.clear()
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await self._run(self._write_batch, batch)
+        except sqlite3.Error:
+            self._pending[:0] = batch
+            raise
+
+    def _write_batch(self, batch):
+        with self._db:
+            for sql, params in batch:
+                self._db.execute(sql, params)
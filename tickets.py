@@ -0,0 +1,242 @@
+import asyncio
+import heapq
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+# ticket creation pipeline helpers: a bounded per-guild queue that limits how many
+# channels are being created at once, and rolling timings for each stage. plus the
+# registry of persisted tickets and the per-guild queue of tickets waiting for staff.
+
+
+class QueueFull(Exception):
+    pass
+
+
+class _GuildQueue:
+    def __init__(self, concurrency):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+
+
+class TicketQueue:
+    def __init__(self, concurrency=2, max_waiting=50):
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self._guilds = {}
+
+    def waiting(self, guild_id):
+        guild = self._guilds.get(guild_id)
+        return guild.waiting if guild else 0
+
+    #notify(position) is awaited when the caller has to wait for a slot
+    @asynccontextmanager
+    async def slot(self, guild_id, notify=None):
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            guild = self._guilds[guild_id] = _GuildQueue(self.concurrency)
+        if guild.waiting >= self.max_waiting:
+            raise QueueFull(guild.waiting)
+        guild.waiting += 1
+        try:
+            if guild.semaphore.locked() and notify:
+                await notify(guild.waiting)
+            await guild.semaphore.acquire()
+        finally:
+            guild.waiting -= 1
+        try:
+            yield
+        finally:
+            guild.semaphore.release()
+
+
+class StageTimings:
+    def __init__(self, keep=500):
+        self._samples = defaultdict(lambda: deque(maxlen=keep))
+
+    @contextmanager
+    def stage(self, name, record=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, record)
+
+    def record(self, name, seconds, record=None):
+        self._samples[name].append(seconds)
+        if record is not None:
+            record[name] = seconds
+
+    def summary(self):
+        lines = ['Ticket open stages (p50 / max / samples):']
+        for name, samples in self._samples.items():
+            ordered = sorted(samples)
+            lines.append(f'  {name}: {ordered[len(ordered) // 2] * 1000:.0f}ms / {ordered[-1] * 1000:.0f}ms / {len(ordered)}')
+        return '\n'.join(lines)
+
+
+#open tickets nobody has claimed yet, urgent first and then oldest. a min-heap per
+#guild plus a dict of the live entries: claimed or closed tickets only leave the dict,
+#their heap entries are skipped when they reach the top
+class ClaimQueue:
+    def __init__(self):
+        self._heaps = {}
+        self._waiting = {}
+
+    @staticmethod
+    def _entry(ticket):
+        return (not ticket.urgent, ticket.opened_at, ticket.channel_id)
+
+    def push(self, ticket):
+        entry = self._entry(ticket)
+        waiting = self._waiting.setdefault(ticket.guild_id, {})
+        waiting[ticket.channel_id] = entry
+        heap = self._heaps.setdefault(ticket.guild_id, [])
+        heapq.heappush(heap, entry)
+        #stale entries would otherwise pile up under tickets that are never popped
+        if len(heap) > 2 * len(waiting) + 64:
+            self._heaps[ticket.guild_id] = sorted(waiting.values())
+
+    def discard(self, ticket):
+        waiting = self._waiting.get(ticket.guild_id)
+        if waiting:
+            waiting.pop(ticket.channel_id, None)
+
+    #channel id of the next ticket, or None
+    def pop(self, guild_id):
+        heap = self._heaps.get(guild_id)
+        waiting = self._waiting.get(guild_id, {})
+        while heap:
+            entry = heapq.heappop(heap)
+            if waiting.get(entry[2]) == entry:
+                del waiting[entry[2]]
+                return entry[2]
+        return None
+
+    def count(self, guild_id):
+        return len(self._waiting.get(guild_id, ()))
+
+    def position(self, ticket):
+        entry = self._entry(ticket)
+        return sum(1 for other in self._waiting.get(ticket.guild_id, {}).values() if other < entry) + 1
+
+    def peek(self, guild_id, limit):
+        return [entry[2] for entry in heapq.nsmallest(limit, self._waiting.get(guild_id, {}).values())]
+
+
+#(guild, channel) and (guild, user) lookups over the persisted tickets
+class TicketRegistry:
+    def __init__(self, store):
+        self.store = store
+        #admin tickets are reports about staff, only administrators see or claim them
+        self.waiting = ClaimQueue()
+        self.admin_waiting = ClaimQueue()
+        self._by_channel = {}
+        self._by_user = {}
+        #(guild, user) with a ticket channel being created right now
+        self._pending = set()
+        self._loaded = set()
+
+    def by_channel(self, guild_id, channel_id):
+        return self._by_channel.get((guild_id, channel_id))
+
+    #only open tickets are indexed by user
+    def by_user(self, guild_id, user_id):
+        return self._by_user.get((guild_id, user_id))
+
+    #holds (guild, user) while their ticket is created, False if they already have one open
+    #or on the way. no awaits here, so two /ticket calls cannot both get through
+    def reserve(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        if key in self._by_user or key in self._pending:
+            return False
+        self._pending.add(key)
+        return True
+
+    def release(self, guild_id, user_id):
+        self._pending.discard((guild_id, user_id))
+
+    def open_tickets(self, guild_id):
+        return [ticket for (ticket_guild_id, _), ticket in self._by_user.items() if ticket_guild_id == guild_id]
+
+    def _index(self, ticket):
+        self._by_channel[(ticket.guild_id, ticket.channel_id)] = ticket
+        if ticket.is_open:
+            self._by_user[(ticket.guild_id, ticket.user_id)] = ticket
+            if ticket.claimed_by is None:
+                self.queue_for(ticket).push(ticket)
+
+    def _unindex(self, ticket):
+        self._by_channel.pop((ticket.guild_id, ticket.channel_id), None)
+        if self._by_user.get((ticket.guild_id, ticket.user_id)) is ticket:
+            del self._by_user[(ticket.guild_id, ticket.user_id)]
+        self.queue_for(ticket).discard(ticket)
+
+    def queue_for(self, ticket):
+        return self.admin_waiting if ticket.admin else self.waiting
+
+    #rebuild the index for a guild once, dropping tickets whose channel is gone
+    async def load_guild(self, guild):
+        if guild.id in self._loaded:
+            return
+        settings = await self.store.guild(guild.id)
+        if guild.id in self._loaded:
+            return
+        for ticket in list(settings.tickets.values()):
+            if guild.get_channel(ticket.channel_id) is None:
+                settings.remove_ticket(ticket.channel_id)
+            else:
+                self._index(ticket)
+        self._loaded.add(guild.id)
+
+    async def open(self, guild_id, user_id, channel, urgent=False, admin=False):
+        settings = await self.store.guild(guild_id)
+        ticket = settings.open_ticket(user_id, channel.id, channel.name, urgent, admin)
+        self._index(ticket)
+        return ticket
+
+    #assigns the next waiting ticket to a staff member, administrators take admin tickets first
+    async def claim_next(self, guild_id, staff_id, admin=False):
+        settings = await self.store.guild(guild_id)
+        channel_id = self.admin_waiting.pop(guild_id) if admin else None
+        if channel_id is None:
+            channel_id = self.waiting.pop(guild_id)
+        if channel_id is None:
+            return None
+        ticket = self._by_channel[(guild_id, channel_id)]
+        settings.claim_ticket(ticket, staff_id)
+        return ticket
+
+    def waiting_tickets(self, guild_id, limit=20, admin=False):
+        channel_ids = self.admin_waiting.peek(guild_id, limit) if admin else []
+        channel_ids += self.waiting.peek(guild_id, limit - len(channel_ids))
+        return [self._by_channel[(guild_id, channel_id)] for channel_id in channel_ids]
+
+    def waiting_count(self, guild_id, admin=False):
+        return self.waiting.count(guild_id) + (self.admin_waiting.count(guild_id) if admin else 0)
+
+    async def close(self, ticket):
+        settings = await self.store.guild(ticket.guild_id)
+        self._unindex(ticket)
+        settings.close_ticket(ticket)
+        self._index(ticket)
+
+    async def rename(self, ticket, channel_name):
+        settings = await self.store.guild(ticket.guild_id)
+        ticket.channel_name = channel_name
+        settings.save_ticket(ticket)
+
+    async def remove(self, guild_id, channel_id):
+        ticket = self._by_channel.get((guild_id, channel_id))
+        if ticket is None:
+            return None
+        settings = await self.store.guild(guild_id)
+        settings.remove_ticket(channel_id)
+        self._unindex(ticket)
+        return ticket
+
+    async def reset(self, guild_id):
+        settings = await self.store.guild(guild_id)
+        for ticket in settings.tickets.values():
+            self._unindex(ticket)
+        settings.reset()
@@ -0,0 +1,126 @@
+import asyncio
+import gzip
+import html
+import json
+import os
+
+import discord
+
+# ticket transcripts: channel history is streamed oldest first into gzipped JSONL
+# (and optionally a static HTML page). messages are written in batches on a worker
+# thread, so memory stays at one batch however long the ticket is.
+
+BATCH_SIZE = 500
+
+HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>body{{font-family:sans-serif;background:#313338;color:#dbdee1}}.m{{margin:6px 0}}.a{{font-weight:bold;color:#fff}}.t{{color:#949ba4;font-size:12px}}</style>
+</head><body><h2>{title}</h2>
+"""
+HTML_FOOT = "</body></html>\n"
+
+
+def message_record(message):
+    return {
+        'id': message.id,
+        'author_id': message.author.id,
+        'author': str(message.author),
+        'created_at': message.created_at.isoformat(),
+        'content': message.content,
+        'attachments': [attachment.url for attachment in message.attachments],
+        'embeds': len(message.embeds),
+    }
+
+
+def html_row(record):
+    attachments = ''.join(
+        f'<br><a href="{html.escape(url)}">{html.escape(url)}</a>' for url in record['attachments']
+    )
+    return (
+        f'<div class="m"><span class="a">{html.escape(record["author"])}</span> '
+        f'<span class="t">{record["created_at"]}</span><br>{html.escape(record["content"])}{attachments}</div>\n'
+    )
+
+
+class TranscriptWriter:
+    def __init__(self, path, title, render_html=False):
+        self.path = path
+        self.html_path = path.replace('.jsonl.gz', '.html.gz') if render_html else None
+        self.title = title
+        self.count = 0
+        self._files = []
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._files.append(gzip.open(self.path, 'wt', encoding='utf-8'))
+        if self.html_path:
+            page = gzip.open(self.html_path, 'wt', encoding='utf-8')
+            page.write(HTML_HEAD.format(title=html.escape(self.title)))
+            self._files.append(page)
+
+    def _write(self, records):
+        self._files[0].write(''.join(json.dumps(record) + '\n' for record in records))
+        if self.html_path:
+            self._files[1].write(''.join(html_row(record) for record in records))
+
+    def _close(self):
+        if self.html_path and len(self._files) > 1:
+            self._files[1].write(HTML_FOOT)
+        for file in self._files:
+            file.close()
+
+    async def write_history(self, history):
+        await asyncio.to_thread(self._open)
+        try:
+            batch = []
+            async for message in history:
+                batch.append(message_record(message))
+                if len(batch) >= BATCH_SIZE:
+                    await asyncio.to_thread(self._write, batch)
+                    self.count += len(batch)
+                    batch = []
+            if batch:
+                await asyncio.to_thread(self._write, batch)
+                self.count += len(batch)
+        finally:
+            await asyncio.to_thread(self._close)
+        return self.count
+
+
+async def archive_ticket(channel, directory, archive_category=None, render_html=False):
+    path = os.path.join(directory, str(channel.guild.id), f'{channel.id}-{channel.name}.jsonl.gz')
+    writer = TranscriptWriter(path, f'{channel.guild.name} #{channel.name}', render_html)
+    count = await writer.write_history(channel.history(limit=None, oldest_first=True))
+    name = f'closed-{channel.name}'[:100]
+    if archive_category is not None:
+        await channel.edit(name=name, category=archive_category)
+    else:
+        await channel.edit(name=name)
+    return path, count, name
+
+
+#background archive jobs, a few at a time so a wave of closes does not hog the REST buckets
+class ArchiveJobs:
+    def __init__(self, concurrency=2):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+
+    def submit(self, coro, done=None):
+        task = asyncio.create_task(self._run(coro, done))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, coro, done):
+        async with self._semaphore:
+            try:
+                result = await coro
+            except (discord.HTTPException, OSError) as e:
+                print(f'Error archiving ticket: {e}')
+                return
+        if done:
+            await done(*result)
+
+    async def wait(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+# user lookups: the client's own cache first, then an LRU of recently fetched or
+# seen users with a TTL, and only then a REST fetch. concurrent fetches of the same
+# id share one request.
+
+
+class UserResolver:
+    def __init__(self, client, size=2000, ttl=900.0):
+        self.client = client
+        self.size = size
+        self.ttl = ttl
+        self.local_hits = 0
+        self.cache_hits = 0
+        self.merged = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._inflight = {}
+
+    def stats(self):
+        return {
+            'local_hits': self.local_hits,
+            'cache_hits': self.cache_hits,
+            'merged': self.merged,
+            'misses': self.misses,
+            'cached': len(self._cache),
+        }
+
+    #users seen on the gateway (joins, leaves) are kept for a later /banid or /send_dm
+    def remember(self, user):
+        self._cache[user.id] = (user, time.monotonic() + self.ttl)
+        self._cache.move_to_end(user.id)
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    #cache-only lookup, never hits the network
+    def peek(self, user_id):
+        user = self.client.get_user(user_id)
+        if user is not None:
+            self.local_hits += 1
+            return user
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        self.cache_hits += 1
+        return entry[0]
+
+    async def resolve(self, user_id):
+        user = self.peek(user_id)
+        if user is not None:
+            return user
+        pending = self._inflight.get(user_id)
+        if pending is not None:
+            self.merged += 1
+            return await asyncio.shield(pending)
+        self.misses += 1
+        pending = self._inflight[user_id] = asyncio.ensure_future(self.client.fetch_user(user_id))
+        try:
+            user = await asyncio.shield(pending)
+        finally:
+            self._inflight.pop(user_id, None)
+        self.remember(user)
+        return user